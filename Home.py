@@ -1,8 +1,12 @@
 import streamlit as st
 from pathlib import Path
-from src.classes.file import File
+from src.classes.upload_store import touch_session_upload
+from src.functions.instrumentation import show_measures, start_collecting
 
 st.set_page_config(page_title="Projet Data Mining", layout="centered")
+mesures = start_collecting()
+# Le fichier déjà chargé dans la session reste récent pour le nettoyage des envois.
+touch_session_upload(st.session_state)
 st.title("📊 Projet Data Mining")
 st.subheader("Partie I : Exploration initiale des données")
 
@@ -15,9 +19,10 @@ if uploaded_file is not None:
     st.markdown("### 🛠️ Choix du délimiteur")
     delimiter = st.radio(
         "Quel est le séparateur utilisé dans votre fichier ?",
-        options=[",", ";", "\t", "|", " "],
+        options=[None, ",", ";", "\t", "|", " "],
         index=0,
         format_func=lambda x: {
+            None: "Détection automatique",
             ",": "Virgule `,`",
             ";": "Point-virgule `;`",
             "\t": "Tabulation `\\t`",
@@ -26,26 +31,35 @@ if uploaded_file is not None:
         }[x]
     )
 
-    if st.button("📂 Charger les données avec ce délimiteur"):
+    if st.button("📂 Charger les données"):
         try:
-            uploads_dir = Path("uploads")
-            uploads_dir.mkdir(exist_ok=True)
-            saved_path = uploads_dir / uploaded_file.name
-            with open(saved_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
+            # Lecteur (et pandas) chargés au premier fichier seulement : la page d'accueil s'affiche sans attendre.
+            from src.classes.file import File
+
+            fichier = File(uploaded_file, delimiter=delimiter)
+            fichier.save_temporarily()
+            saved_path = Path(fichier.temp_path)
+            dialect = fichier.sniff()
+            delimiter = dialect["delimiter"]
 
             # 🔸 Enregistrer chemin et délimiteur en session
             st.session_state["csv_path"] = str(saved_path)
+            st.session_state["filename"] = fichier.filename
             st.session_state["delimiter"] = delimiter
 
-            fichier = File(saved_path, delimiter=delimiter)
             stats = fichier.get_stats()
             df = stats["df"]
             
             st.session_state["df"] = df
+            st.session_state["dataset_key"] = fichier.cache_key
             st.session_state["delimiter"] = delimiter
 
             st.success("✅ Fichier chargé avec succès !")
+            st.caption(
+                f"Format détecté : séparateur `{dialect['delimiter']!r}`, décimale `{dialect['decimal']}`, "
+                f"encodage `{dialect['encoding']}`, "
+                f"{'avec' if dialect['header'] else 'sans'} ligne d'en-tête."
+            )
 
             st.markdown("### 🔍 Aperçu du début des données")
             st.dataframe(df.head())
@@ -61,10 +75,13 @@ if uploaded_file is not None:
             st.write("**Types de données :**", stats["dtypes"])
             st.write("**Valeurs manquantes :**", stats["missing_values"])
 
-            st.markdown("### 📈 Statistiques descriptives")
-            st.dataframe(df.describe(include='all'))
+            st.markdown("### 📈 Profil des colonnes")
+            st.caption("Quantiles et nombres de valeurs distinctes approchés, calculés pendant la lecture du fichier.")
+            st.dataframe(stats["profile"])
             
         except Exception as e:
             st.error(f"❌ Erreur lors du traitement du fichier : {e}")
 else:
     st.info("Veuillez charger un fichier CSV pour commencer.")
+
+show_measures(mesures)
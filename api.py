@@ -0,0 +1,340 @@
+import inspect
+import io
+import logging
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+from flask import Flask, Response, jsonify, request, send_file
+from werkzeug.exceptions import HTTPException
+
+from src.classes.clustering import Clustering
+from src.classes.dataset_cache import get_dataset_cache
+from src.classes.file import BLOCK_SIZE, File
+from src.classes.job_queue import clustering_job, get_job_queue, prediction_job
+from src.classes.model_registry import get_model_registry
+from src.classes.prediction import Prediction, fit_prediction
+from src.classes.preprocessor import Preprocessor
+from src.classes.upload_store import get_upload_store
+from src.exceptions import (
+    APIException, BadRequestJSONException, EmptyDataProvidedException, EmptyRequestException,
+    InvalidCSVException, InvalidParametersException, NotFoundException
+)
+from src.functions.fingerprint import file_fingerprint, params_fingerprint
+from src.functions.streaming import extract_base64_field
+
+PREDICTIONS_DIR = "./cache/predictions"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+CLUSTERING_ALGORITHMS = {"kmeans": "K-Means", "dbscan": "DBSCAN", "hca": "HCA (Hierarchical Clustering)"}
+
+def _json_body():
+    body = request.get_json(silent=True)
+    if body is None:
+        raise BadRequestJSONException()
+    if not body:
+        raise EmptyRequestException()
+    return body
+
+def _required(body, field):
+    if not body.get(field):
+        raise EmptyDataProvidedException(field)
+    return body[field]
+
+def _save_upload():
+    # Le corps est recopié sur disque par blocs : un envoi multipart est déjà
+    # mis en tampon dans un fichier temporaire par werkzeug, un envoi JSON est
+    # décodé à la volée. Le fichier est rangé par empreinte de son contenu.
+    with get_upload_store().writer() as out:
+        if request.mimetype == "multipart/form-data":
+            upload = request.files.get("file")
+            if upload is None:
+                raise EmptyDataProvidedException("file")
+            shutil.copyfileobj(upload.stream, out, BLOCK_SIZE)
+            fields = request.form.to_dict()
+            fields.setdefault("filename", upload.filename)
+        elif request.mimetype == "application/json":
+            fields = extract_base64_field(request.stream, out)
+        else:
+            raise BadRequestJSONException()
+    return out.path, fields
+
+def _clustering_params(algorithm, params):
+    # Vérifiés contre la signature de `run_<algorithme>` : une clé inconnue
+    # donne une erreur 400 plutôt qu'une TypeError au moment du calcul.
+    if not isinstance(params, dict):
+        raise InvalidParametersException(description="params must be an object.")
+    accepted = set(inspect.signature(getattr(Clustering, f"run_{algorithm}")).parameters) - {"self"}
+    unknown = sorted(set(params) - accepted)
+    if unknown:
+        raise InvalidParametersException(
+            description=f"Unknown parameters for {algorithm}: {unknown}. Accepted: {sorted(accepted)}"
+        )
+    return params
+
+def _dataset(dataset_id):
+    df = get_dataset_cache().get(dataset_id)
+    if df is None:
+        raise NotFoundException("Dataset")
+    return df
+
+def _model(model_id):
+    model = get_model_registry().get(model_id)
+    if model is None:
+        raise NotFoundException("Model")
+    return model
+
+def _frame_response(df):
+    # JSON par défaut, Arrow (flux IPC) sur demande : ?format=arrow ou en-tête Accept.
+    wants_arrow = request.args.get("format") == "arrow" or (
+        request.accept_mimetypes.best_match(["application/json", ARROW_MIMETYPE]) == ARROW_MIMETYPE
+    )
+    if wants_arrow:
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(sink.getvalue(), mimetype=ARROW_MIMETYPE)
+    return Response(df.to_json(orient="records", force_ascii=False), mimetype="application/json")
+
+def _limited(df):
+    limit = request.args.get("limit", type=int)
+    return df.head(limit) if limit is not None else df
+
+def _describe(dataset_id, df, missing=None, **extra):
+    # `missing` est fourni quand il a déjà été calculé pendant la lecture.
+    if missing is None:
+        missing = {col: int(n) for col, n in df.isnull().sum().items()}
+    return {
+        "dataset_id": dataset_id,
+        "shape": {"rows": df.shape[0], "columns": df.shape[1]},
+        "columns": list(df.columns),
+        "dtypes": dict(df.dtypes.astype(str)),
+        "missing_values": missing,
+        **extra
+    }
+
+def create_app():
+    app = Flask(__name__)
+
+    @app.errorhandler(APIException)
+    def handle_api_exception(e):
+        return jsonify(e.to_dict()), e.code
+
+    @app.errorhandler(ValueError)
+    def handle_value_error(e):
+        return jsonify(InvalidParametersException(description=str(e)).to_dict()), 400
+
+    @app.errorhandler(Exception)
+    def handle_exception(e):
+        if isinstance(e, HTTPException):
+            # Erreurs HTTP de werkzeug (404, 405, 413...).
+            return jsonify({"error": e.name, "description": e.description}), e.code
+        logging.exception(e)
+        return jsonify(APIException().to_dict()), 500
+
+    @app.post("/datasets")
+    def upload_dataset():
+        path, fields = _save_upload()
+        try:
+            fichier = File(path, delimiter=fields.get("delimiter") or None)
+            fichier.filename = fields.get("filename") or fichier.filename
+            dialect = fichier.sniff()
+            stats = fichier.get_stats()
+        except Exception as e:
+            # Le fichier, rangé par empreinte, peut être partagé avec un autre
+            # jeu de données : il est laissé au nettoyage périodique.
+            logging.error(f"CSV invalide {path} : {e}")
+            raise InvalidCSVException()
+        df = stats["df"]
+        if fichier.cache_key is None:
+            raise APIException(description="Dataset cache unavailable.")
+        return jsonify(_describe(
+            fichier.cache_key, df, missing=stats["missing_values"], filename=fichier.filename, dialect=dialect
+        )), 201
+
+    @app.get("/datasets/<dataset_id>")
+    def get_dataset(dataset_id):
+        return _frame_response(_limited(_dataset(dataset_id)))
+
+    @app.post("/datasets/<dataset_id>/preprocess")
+    def preprocess_dataset(dataset_id):
+        df = _dataset(dataset_id)
+        body = _json_body()
+        params = {
+            "columns": _required(body, "columns"),
+            "imputation": body.get("imputation"),
+            "scaling": body.get("scaling"),
+            "n_neighbors": int(body.get("n_neighbors", 3)),
+            "max_iter": int(body.get("max_iter", 10)),
+            "knn_mode": body.get("knn_mode", "exact")
+        }
+        missing = [col for col in params["columns"] if col not in df.columns]
+        if missing:
+            raise InvalidParametersException(description=f"Unknown columns: {missing}")
+
+        result_id = params_fingerprint(dataset_id, "preprocess", sorted((k, repr(v)) for k, v in params.items()))
+        cache = get_dataset_cache()
+        result = cache.get(result_id)
+        if result is None:
+            result = Preprocessor(**params).fit_transform(df)
+            cache.put(result_id, result)
+        return jsonify(_describe(result_id, result, source_id=dataset_id)), 201
+
+    @app.post("/preprocess")
+    def preprocess_file():
+        # Prétraitement d'un CSV envoyé, bloc par bloc depuis le fichier : le
+        # jeu n'est jamais chargé en entier et le résultat est renvoyé en CSV
+        # au fil de l'eau, pour des fichiers plus grands que la mémoire.
+        path, fields = _save_upload()
+        columns = fields.get("columns") or []
+        if isinstance(columns, str):
+            columns = [col for col in columns.split(",") if col]
+        if not columns:
+            raise EmptyDataProvidedException("columns")
+        fichier = File(path, delimiter=fields.get("delimiter") or None)
+        try:
+            kinds = fichier.infer_dtypes()
+        except Exception as e:
+            logging.error(f"CSV invalide {path} : {e}")
+            raise InvalidCSVException()
+        invalid = [col for col in columns if kinds.get(col) != "numeric"]
+        if invalid:
+            raise InvalidParametersException(description=f"Unknown or non-numeric columns: {invalid}")
+
+        preprocessor = Preprocessor(
+            columns,
+            imputation=fields.get("imputation") or None,
+            scaling=fields.get("scaling") or None,
+            n_neighbors=int(fields.get("n_neighbors", 3)),
+            max_iter=int(fields.get("max_iter", 10)),
+            knn_mode=fields.get("knn_mode", "exact")
+        ).fit(fichier)
+        return Response(
+            preprocessor.iter_csv(fichier),
+            mimetype="text/csv",
+            headers={"Content-Disposition": "attachment; filename=donnees_traitees.csv"}
+        )
+
+    @app.post("/datasets/<dataset_id>/clustering")
+    def cluster_dataset(dataset_id):
+        df = _dataset(dataset_id)
+        body = _json_body()
+        algorithm = _required(body, "algorithm")
+        if algorithm not in CLUSTERING_ALGORITHMS:
+            raise InvalidParametersException(description=f"Unknown algorithm: {algorithm}")
+        columns = _required(body, "columns")
+        params = _clustering_params(algorithm, body.get("params", {}))
+
+        registry = get_model_registry()
+        model_id = registry.key("clustering", dataset_id, colonnes=columns, algo=CLUSTERING_ALGORITHMS[algorithm], **params)
+        if body.get("async"):
+            job_id = get_job_queue().submit(
+                clustering_job, df, columns, CLUSTERING_ALGORITHMS[algorithm], params, model_id, key=model_id
+            )
+            return jsonify({"job_id": job_id, "model_id": model_id}), 202
+        clustering = registry.get(model_id)
+        if clustering is None:
+            clustering = Clustering(df)
+            clustering.set_features(columns)
+            getattr(clustering, f"run_{algorithm}")(**params)
+            registry.put(model_id, clustering)
+
+        stats = clustering.get_cluster_stats()
+        stats.columns = [f"{col}_{agg}" for col, agg in stats.columns]
+        return jsonify({
+            "model_id": model_id,
+            "mode": clustering.mode,
+            "n_clusters": int(len(set(clustering.labels.tolist()) - {-1})),
+            "cluster_stats": stats.reset_index().to_dict(orient="records")
+        }), 201
+
+    @app.post("/datasets/<dataset_id>/prediction")
+    def train_prediction(dataset_id):
+        df = _dataset(dataset_id)
+        body = _json_body()
+        features = _required(body, "features")
+        target = _required(body, "target")
+        task_type = _required(body, "task_type")
+        algorithm = _required(body, "algorithm")
+        params = body.get("params", {})
+        encoding = body.get("encoding", "onehot")
+        tune = bool(body.get("tune", False))
+
+        registry = get_model_registry()
+        model_id = registry.key(
+            "prediction", dataset_id, features=features, target=target,
+            task_type=task_type, algo=algorithm, encoding=encoding, tune=tune, **params
+        )
+        if body.get("async"):
+            job_id = get_job_queue().submit(
+                prediction_job, df, features, target, task_type, algorithm, params, model_id,
+                encoding=encoding, tune=tune, key=model_id
+            )
+            return jsonify({"job_id": job_id, "model_id": model_id}), 202
+        predictor = registry.get(model_id)
+        if predictor is None:
+            predictor = fit_prediction(
+                df, features, target, task_type, algorithm, params, model_id, encoding=encoding, tune=tune
+            )
+
+        metrics = {name: float(value) for name, value in predictor.evaluate().items()}
+        return jsonify({
+            "model_id": model_id,
+            "metrics": metrics,
+            "best_params": predictor.best_params,
+            "cv_score": predictor.cv_score,
+            "incremental_rows": predictor.incremental_rows
+        }), 201
+
+    @app.get("/jobs/<job_id>")
+    def get_job(job_id):
+        try:
+            return jsonify(get_job_queue().status(job_id))
+        except KeyError:
+            raise NotFoundException("Job")
+
+    @app.delete("/jobs/<job_id>")
+    def cancel_job(job_id):
+        try:
+            cancelled = get_job_queue().cancel(job_id)
+        except KeyError:
+            raise NotFoundException("Job")
+        return jsonify({"id": job_id, "cancelled": cancelled})
+
+    @app.post("/models/<model_id>/predict")
+    def predict_model(model_id):
+        model = _model(model_id)
+        if not isinstance(model, Prediction):
+            raise InvalidParametersException(description="Only prediction models can score new data.")
+        # Le fichier à prédire reste dans le stockage des envois : un même fichier
+        # n'est pas réécrit, et il sera supprimé par le nettoyage LRU.
+        path, fields = _save_upload()
+        keep_columns = [col for col in fields.get("keep_columns", "").split(",") if col]
+        output_path = Path(PREDICTIONS_DIR) / f"{params_fingerprint(model_id, file_fingerprint(path), keep_columns)}.csv"
+        if not output_path.exists():
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = output_path.with_suffix(f".{os.getpid()}.tmp")
+            try:
+                model.predict_batch(File(path), tmp_path, keep_columns=keep_columns)
+                os.replace(tmp_path, output_path)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+        return send_file(output_path.resolve(), mimetype="text/csv", as_attachment=True, download_name="predictions.csv")
+
+    @app.get("/models/<model_id>/result")
+    def get_model_result(model_id):
+        model = _model(model_id)
+        if isinstance(model, Clustering):
+            result = model.get_result_dataframe()
+        else:
+            result = model.get_predictions_dataframe()
+        return _frame_response(_limited(pd.DataFrame(result)))
+
+    return app
+
+if __name__ == "__main__":
+    create_app().run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+CHUNKSIZE = 100_000
+
+# Même structure que data/wdbc.csv : identifiant, diagnostic M/B, 30 mesures.
+WDBC_MEASURES = [
+    "Radius", "Texture", "Perimeter", "Area", "Smoothness",
+    "Compactness", "Concavity", "Concave Points", "Symmetry", "Fractal Dimension"
+]
+WDBC_FEATURES = (
+    [f"Mean {name}" for name in WDBC_MEASURES]
+    + [f"{name} SE" for name in WDBC_MEASURES]
+    + [f"Worst {name}" for name in WDBC_MEASURES]
+)
+# Même structure que data/planete.csv : pressions partielles (souvent nulles) et type de planète.
+PLANETE_FEATURES = ["PH2O", "PHe", "PCH4", "PH2", "PN2", "PNH3", "PO2", "PAr", "PCO2", "PSO2", "PK"]
+PLANETE_TYPES = ["r", "g", "d", "i", "l"]
+PLANETE_WEIGHTS = [0.46, 0.267, 0.143, 0.126, 0.004]
+
+DATASETS = {
+    "wdbc": {"features": WDBC_FEATURES, "target": "Diagnosis", "delimiter": ","},
+    "planete": {"features": PLANETE_FEATURES, "target": "Type", "delimiter": ";"}
+}
+
+def _wdbc_chunk(rng, start, n_rows, nan_ratio):
+    malignant = rng.random(n_rows) < 0.37
+    # Moyennes propres à chaque mesure, décalées d'environ un écart-type pour les tumeurs malignes.
+    scale = np.geomspace(0.005, 1000, len(WDBC_FEATURES))
+    shift = np.where(malignant, 1.0, 0.0)[:, None]
+    values = scale * np.exp(0.3 * (rng.standard_normal((n_rows, len(WDBC_FEATURES))) + shift))
+    values[rng.random(values.shape) < nan_ratio] = np.nan
+    df = pd.DataFrame(values.round(5), columns=WDBC_FEATURES)
+    df.insert(0, "Diagnosis", np.where(malignant, "M", "B"))
+    df.insert(0, "ID number", np.arange(start, start + n_rows) + 800_000)
+    return df
+
+def _planete_chunk(rng, start, n_rows, nan_ratio):
+    types = rng.choice(len(PLANETE_TYPES), n_rows, p=PLANETE_WEIGHTS)
+    # Chaque type de planète a sa propre composition moyenne ; ~70 % des pressions sont nulles.
+    profiles = np.random.default_rng(0).gamma(0.5, 10.0, (len(PLANETE_TYPES), len(PLANETE_FEATURES)))
+    values = profiles[types] * rng.exponential(1.0, (n_rows, len(PLANETE_FEATURES)))
+    values[rng.random(values.shape) < 0.7] = 0.0
+    values[rng.random(values.shape) < nan_ratio] = np.nan
+    df = pd.DataFrame(values.round(2), columns=PLANETE_FEATURES)
+    df["Type"] = np.array(PLANETE_TYPES)[types]
+    return df
+
+def generate(kind, n_rows, path, nan_ratio=0.01, seed=0):
+    # Écriture par blocs : un fichier de 10M lignes ne passe jamais en mémoire.
+    chunk_function = {"wdbc": _wdbc_chunk, "planete": _planete_chunk}[kind]
+    rng = np.random.default_rng(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        for start in range(0, n_rows, CHUNKSIZE):
+            chunk = chunk_function(rng, start, min(CHUNKSIZE, n_rows - start), nan_ratio)
+            chunk.to_csv(f, sep=DATASETS[kind]["delimiter"], header=start == 0, index=False)
+    return path
@@ -0,0 +1,117 @@
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.generators import DATASETS, generate
+from benchmarks.stages import MAX_ROWS, STAGES
+
+DATA_DIR = "./cache/benchmarks"
+BASELINE_PATH = "benchmarks/baseline.json"
+TOLERANCE = 0.25
+# En dessous, les écarts de temps relèvent du bruit de mesure.
+MIN_WALL_TIME = 0.1
+SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+def parse_size(text):
+    text = text.strip().lower()
+    if text[-1] in SUFFIXES:
+        return int(float(text[:-1]) * SUFFIXES[text[-1]])
+    return int(text)
+
+def dataset_path(kind, n_rows, nan_ratio):
+    path = Path(DATA_DIR) / f"{kind}_{n_rows}_{nan_ratio}.csv"
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        print(f"Génération de {path}...", file=sys.stderr)
+        tmp_path = path.with_suffix(".tmp")
+        generate(kind, n_rows, tmp_path, nan_ratio=nan_ratio)
+        tmp_path.replace(path)
+    return path
+
+def measure(stage, path, kind, timeout):
+    # Un processus par mesure : pic mémoire et caches ne se contaminent pas d'une étape à l'autre.
+    try:
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.stages", stage, str(path), kind],
+            capture_output=True, text=True, timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        return {"stage": stage, "error": f"délai dépassé ({timeout} s)"}
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines()
+        return {"stage": stage, "error": lines[-1] if lines else f"code {completed.returncode}"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def compare(results, baseline, tolerance):
+    # Régression : temps ou pic mémoire supérieur de plus de `tolerance` à la référence.
+    flags = []
+    for result in results:
+        reference = baseline.get(result["key"])
+        if reference is None or "error" in result:
+            flags.append("")
+            continue
+        issues = []
+        if result["wall_time"] > MIN_WALL_TIME and result["wall_time"] > reference["wall_time"] * (1 + tolerance):
+            issues.append(f"temps x{result['wall_time'] / reference['wall_time']:.2f}")
+        if (result.get("peak_rss_mb") and reference.get("peak_rss_mb")
+                and result["peak_rss_mb"] > reference["peak_rss_mb"] * (1 + tolerance)):
+            issues.append(f"mémoire x{result['peak_rss_mb'] / reference['peak_rss_mb']:.2f}")
+        flags.append("RÉGRESSION " + ", ".join(issues) if issues else "ok")
+    return flags
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mesure des étapes de l'application sur des données synthétiques.")
+    parser.add_argument("--sizes", default="10k,100k,1M", help="Tailles séparées par des virgules (10k ... 10M).")
+    parser.add_argument("--datasets", default="wdbc,planete", help=f"Parmi : {', '.join(DATASETS)}.")
+    parser.add_argument("--stages", default="all", help=f"'all' ou parmi : {', '.join(STAGES)}.")
+    parser.add_argument("--nan-ratio", type=float, default=0.01, help="Part de valeurs manquantes injectées.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Fichier de référence (JSON).")
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistre ces mesures comme référence.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Écart relatif toléré.")
+    parser.add_argument("--timeout", type=int, default=3600, help="Durée maximale d'une mesure (s).")
+    parser.add_argument("--output", help="Enregistre aussi les mesures détaillées (JSON).")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    kinds = args.datasets.split(",")
+    stages = list(STAGES) if args.stages == "all" else args.stages.split(",")
+    unknown = [name for name in kinds if name not in DATASETS] + [name for name in stages if name not in STAGES]
+    if unknown:
+        parser.error(f"Inconnu : {', '.join(unknown)}")
+
+    results = []
+    for kind in kinds:
+        for n_rows in sizes:
+            path = dataset_path(kind, n_rows, args.nan_ratio)
+            for stage in stages:
+                if n_rows > MAX_ROWS.get(stage, n_rows):
+                    continue
+                print(f"{kind} {n_rows} {stage}...", file=sys.stderr)
+                result = measure(stage, path, kind, args.timeout)
+                result.update(dataset=kind, size=n_rows, key=f"{kind}|{n_rows}|{stage}")
+                results.append(result)
+
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    flags = compare(results, baseline, args.tolerance)
+
+    table = pd.DataFrame(results).drop(columns="key")
+    table = table[["dataset", "size"] + [col for col in table.columns if col not in ("dataset", "size")]]
+    table["référence"] = flags
+    print(table.to_string(index=False))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    if args.save_baseline:
+        baseline.update({result["key"]: result for result in results if "error" not in result})
+        baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True))
+        print(f"Référence enregistrée dans {baseline_path}", file=sys.stderr)
+    elif not baseline:
+        print(f"Aucune référence ({baseline_path}) : relancez avec --save-baseline pour en créer une.", file=sys.stderr)
+    return 1 if any(flag.startswith("RÉGRESSION") for flag in flags) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import json
+import sys
+import time
+
+from benchmarks.generators import DATASETS
+from src.functions.instrumentation import peak_rss_mb
+
+# Au-delà, l'étape n'est pas mesurée (coût quadratique ou démesuré sur un poste).
+MAX_ROWS = {
+    "clustering_dbscan": 200_000,
+    "imputation_knn": 1_000_000,
+    "imputation_iterative": 1_000_000,
+    "prediction_rf": 1_000_000
+}
+
+def ingestion(path, kind):
+    from src.classes.file import File
+
+    return len(File(path, use_cache=False).get_stats()["df"])
+
+def _preprocess(imputation=None, scaling=None):
+    def run(df, kind):
+        from src.classes.preprocessor import Preprocessor
+
+        return len(Preprocessor(DATASETS[kind]["features"], imputation=imputation, scaling=scaling).fit_transform(df))
+    return run
+
+def _clustering(algorithm, **params):
+    def run(df, kind):
+        from src.classes.clustering import Clustering
+
+        clustering = Clustering(df.dropna(subset=DATASETS[kind]["features"]))
+        clustering.set_features(DATASETS[kind]["features"])
+        getattr(clustering, f"run_{algorithm}")(**params)
+        return len(clustering.labels)
+    return run
+
+def _prediction(name, **params):
+    def run(df, kind):
+        from src.classes.prediction import Prediction
+
+        predictor = Prediction(df, DATASETS[kind]["features"], DATASETS[kind]["target"], "classification")
+        predictor.split()
+        predictor.set_model(name, **params)
+        predictor.train()
+        return len(predictor.df)
+    return run
+
+# Étapes mesurées sur un DataFrame déjà chargé ; l'ingestion part du fichier.
+STAGES = {
+    "ingestion": ingestion,
+    "imputation_mean": _preprocess(imputation="mean"),
+    "imputation_median": _preprocess(imputation="median"),
+    "imputation_knn": _preprocess(imputation="knn"),
+    "imputation_iterative": _preprocess(imputation="iterative"),
+    "scaling_zscore": _preprocess(scaling="zscore"),
+    "clustering_kmeans": _clustering("kmeans", n_clusters=3),
+    "clustering_dbscan": _clustering("dbscan", eps=0.5, min_samples=5),
+    "clustering_hca": _clustering("hca", n_clusters=3),
+    "prediction_rf": _prediction("Random Forest", n_estimators=50),
+    "prediction_logreg": _prediction("Logistic Regression"),
+    "prediction_sgd": _prediction("SGD (incrémental)")
+}
+
+def run_stage(stage, path, kind):
+    # Exécutée dans un processus dédié. Imports et chargement du jeu de données
+    # sont faits hors mesure : seul le calcul de l'étape est chronométré.
+    import src.classes.clustering, src.classes.prediction, src.classes.preprocessor  # noqa
+    from src.classes.file import File
+
+    source = path if stage == "ingestion" else File(path, use_cache=False).get_stats()["df"]
+    rss_before = peak_rss_mb()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    n_rows = STAGES[stage](source, kind)
+    wall_time = time.perf_counter() - start
+    result = {
+        "stage": stage,
+        "rows": n_rows,
+        "wall_time": wall_time,
+        "cpu_time": time.process_time() - cpu_start,
+        "rows_per_s": n_rows / wall_time if wall_time else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_before_mb": rss_before
+    }
+    if result["peak_rss_mb"] is not None:
+        # Mémoire ajoutée par l'étape au-delà du pic atteint au chargement.
+        result["stage_rss_mb"] = result["peak_rss_mb"] - rss_before
+    return result
+
+if __name__ == "__main__":
+    print(json.dumps(run_stage(*sys.argv[1:4])))
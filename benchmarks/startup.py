@@ -0,0 +1,89 @@
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.run import BASELINE_PATH, TOLERANCE, compare
+
+MODULES = [
+    "streamlit",
+    "src.classes.file",
+    "src.classes.preprocessor",
+    "src.classes.clustering",
+    "src.classes.prediction",
+    "src.classes.visualizer",
+    "src.classes.job_queue",
+    "api"
+]
+PAGES = [
+    "Home.py",
+    "pages/2_Pretraitement_et_nettoyage.py",
+    "pages/3_Visualisation.py",
+    "pages/4_Clustering.py",
+    "pages/5_Évaluation_du_résultat.py"
+]
+
+# Exécutés dans un interpréteur neuf : rien n'est encore importé.
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+print(json.dumps({"wall_time": time.perf_counter() - start, "modules": len(sys.modules)}))
+"""
+# Premier affichage d'une page, session vide, imports de la page compris.
+RENDER_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+app = AppTest.from_file(sys.argv[1], default_timeout=600).run()
+wall_time = time.perf_counter() - start
+print(json.dumps({"wall_time": wall_time, "modules": len(sys.modules), "exception": bool(app.exception)}))
+"""
+
+def _run(script, target, repeat):
+    # Meilleur temps sur `repeat` processus : le démarrage à froid sans le bruit du poste.
+    best = None
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-c", script, target], capture_output=True, text=True)
+        if completed.returncode != 0:
+            lines = completed.stderr.strip().splitlines()
+            return {"error": lines[-1] if lines else f"code {completed.returncode}"}
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        if best is None or result["wall_time"] < best["wall_time"]:
+            best = result
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Temps d'import des modules et de premier affichage des pages.")
+    parser.add_argument("--repeat", type=int, default=3, help="Nombre de processus par mesure (meilleur temps retenu).")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Fichier de référence (JSON).")
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistre ces mesures comme référence.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Écart relatif toléré.")
+    args = parser.parse_args(argv)
+
+    results = []
+    for module in MODULES:
+        print(f"import {module}...", file=sys.stderr)
+        result = _run(IMPORT_SCRIPT, module, args.repeat)
+        results.append({"stage": "import", "target": module, "key": f"startup|import|{module}", **result})
+    for page in PAGES:
+        print(f"affichage {page}...", file=sys.stderr)
+        result = _run(RENDER_SCRIPT, str(Path(page).resolve()), args.repeat)
+        results.append({"stage": "affichage", "target": page, "key": f"startup|render|{page}", **result})
+
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    table = pd.DataFrame(results).drop(columns="key")
+    table["référence"] = compare(results, baseline, args.tolerance)
+    print(table.to_string(index=False))
+    if args.save_baseline:
+        baseline.update({result["key"]: result for result in results if "error" not in result})
+        baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True))
+        print(f"Référence enregistrée dans {baseline_path}", file=sys.stderr)
+    return 1 if table["référence"].str.startswith("RÉGRESSION").any() else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
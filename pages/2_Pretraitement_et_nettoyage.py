@@ -2,11 +2,53 @@ import streamlit as st
 import pandas as pd
 from pathlib import Path
 from src.classes.file import File
-from sklearn.preprocessing import MinMaxScaler, StandardScaler, RobustScaler
+from src.classes.knn_imputer import FastKNNImputer
+from src.classes.pipeline import PipelineStep
+from src.classes.preprocessor import Preprocessor
+from src.classes.upload_store import touch_session_upload
+from src.functions.instrumentation import show_measures, start_collecting
 
 st.set_page_config(page_title="Pré-traitement", layout="centered")
+mesures = start_collecting()
 st.title("🧹 Partie II : Pré-traitement et nettoyage des données")
 
+METHODES_NA = {
+    "Supprimer les lignes": "drop_rows",
+    "Supprimer les colonnes": "drop_columns",
+    "Remplir par la moyenne": "mean",
+    "Remplir par la médiane": "median",
+    "Remplir par le mode": "mode",
+    "Imputation KNN": "knn",
+    "Imputation par régression": "iterative"
+}
+
+NORMALISATIONS = {
+    "Aucune": None,
+    "Min-Max (0 → 1)": "minmax",
+    "Z-score (moyenne 0, écart-type 1)": "zscore",
+    "RobustScaler (par médiane et IQR)": "robust"
+}
+
+def valeurs_manquantes(df, colonnes):
+    return df[colonnes].isna().sum()
+
+MODES_KNN = {
+    "Exacte (mêmes voisins que KNNImputer)": "exact",
+    "Approximative (index IVF calibré pour retrouver 95 % des voisins)": "approximate"
+}
+
+def imputer(df, colonnes, methode, n_neighbors, max_iter, knn_mode):
+    return Preprocessor(
+        colonnes, imputation=methode, n_neighbors=n_neighbors, max_iter=max_iter, knn_mode=knn_mode
+    ).fit_transform(df)
+
+def rappel_knn(df, colonnes, n_neighbors, knn_mode):
+    X = df[colonnes].to_numpy(dtype="float64", na_value=float("nan"))
+    return FastKNNImputer(n_neighbors=n_neighbors, mode=knn_mode).fit(X).estimate_recall(X)
+
+def normaliser(df, colonnes, methode):
+    return Preprocessor(colonnes, scaling=methode).fit_transform(df)
+
 # ✅ Chargement des infos de session
 if "csv_path" not in st.session_state or "delimiter" not in st.session_state:
     st.warning("Veuillez d'abord charger un fichier dans l'étape 1.")
@@ -15,9 +57,14 @@ if "csv_path" not in st.session_state or "delimiter" not in st.session_state:
 csv_path = Path(st.session_state["csv_path"])
 delimiter = st.session_state["delimiter"]
 
-st.markdown(f"🗂️ **Fichier chargé :** `{csv_path.name}`")
+st.markdown(f"🗂️ **Fichier chargé :** `{st.session_state.get('filename', csv_path.name)}`")
 st.markdown(f"🔣 **Délimiteur :** `{delimiter}`")
 
+# Accès noté : le nettoyage des envois garde les fichiers utilisés récemment.
+if not touch_session_upload(st.session_state):
+    st.warning("⚠️ Le fichier n'est plus disponible sur le serveur. Veuillez le recharger à l'étape 1.")
+    st.stop()
+
 # ✅ Chargement du DataFrame
 try:
     fichier = File(csv_path, delimiter=delimiter)
@@ -32,6 +79,10 @@ except Exception as e:
     st.error(f"❌ Erreur lors du chargement du fichier : {e}")
     st.stop()
 
+# Chaque étape est mémorisée selon (empreinte des données, paramètres) : un
+# changement de normalisation réutilise le résultat de l'imputation.
+etape = PipelineStep.source(df, fichier.cache_key)
+
 # ✅ Sélection des colonnes numériques
 st.markdown("### 🧪 Sélection des colonnes à traiter")
 colonnes_numeriques = df.select_dtypes(include="number").columns.tolist()
@@ -42,9 +93,13 @@ colonnes_choisies = st.multiselect(
 )
 
 if colonnes_choisies:
-    df_avant = df.copy()
+    source = etape
+    na_avant = source.then(
+        "valeurs_manquantes", {"colonnes": colonnes_choisies},
+        lambda d: valeurs_manquantes(d, colonnes_choisies)
+    ).result
 
-    total_na = df[colonnes_choisies].isna().sum().sum()
+    total_na = na_avant.sum()
     if total_na == 0:
         st.info("✅ Aucune valeur manquante dans les colonnes sélectionnées.")
     else:
@@ -54,83 +109,77 @@ if colonnes_choisies:
     st.markdown("### 🧱 Gestion des valeurs manquantes")
     methode_na = st.selectbox(
         "Méthode de traitement :",
-        [
-            "Supprimer les lignes",
-            "Supprimer les colonnes",
-            "Remplir par la moyenne",
-            "Remplir par la médiane",
-            "Remplir par le mode",
-            "Imputation KNN",
-            "Imputation par régression"
-        ],
+        list(METHODES_NA),
         help="Sélectionnez la méthode pour traiter les valeurs manquantes. Les méthodes plus sophistiquées peuvent être plus lentes."
     )
 
-    if methode_na == "Supprimer les lignes":
-        df = df.dropna(subset=colonnes_choisies)
-
-    elif methode_na == "Supprimer les colonnes":
-        colonnes_a_supprimer = [col for col in colonnes_choisies if df[col].isna().any()]
-        if colonnes_a_supprimer:
-            df = df.drop(columns=colonnes_a_supprimer)
-            colonnes_choisies = [col for col in colonnes_choisies if col not in colonnes_a_supprimer]
-            st.warning(f"🗑️ Colonnes supprimées : {', '.join(colonnes_a_supprimer)}")
-        else:
-            st.info("✅ Aucune des colonnes sélectionnées ne contient de valeur manquante.")
-
-    elif methode_na == "Remplir par la moyenne":
-        for col in colonnes_choisies:
-            df[col] = df[col].fillna(df[col].mean())
-
-    elif methode_na == "Remplir par la médiane":
-        for col in colonnes_choisies:
-            df[col] = df[col].fillna(df[col].median())
-
-    elif methode_na == "Remplir par le mode":
-        for col in colonnes_choisies:
-            mode = df[col].mode()
-            if not mode.empty:
-                df[col] = df[col].fillna(mode[0])
+    colonnes_incompletes = [col for col in colonnes_choisies if df[col].isna().any()]
+    n_neighbors = 3
+    max_iter = 10
+    mode_knn = next(iter(MODES_KNN))
 
+    if methode_na in ("Imputation KNN", "Imputation par régression") and not colonnes_incompletes:
+        st.info("✅ Aucune colonne sélectionnée ne nécessite d'imputation.")
     elif methode_na == "Imputation KNN":
-        from sklearn.impute import KNNImputer
-        colonnes_incompletes = [col for col in colonnes_choisies if df[col].isna().any()]
-        if colonnes_incompletes:
-            n_neighbors = st.number_input(
-                "Nombre de voisins (K) :",
-                min_value=1, max_value=20, value=3,
-                help="Le nombre de voisins pour l'imputation KNN."
-            )
-            imputer = KNNImputer(n_neighbors=int(n_neighbors))
-            with st.spinner("Imputation KNN en cours…"):
-                arr = imputer.fit_transform(df[colonnes_incompletes])
-                df_imputed = pd.DataFrame(arr, columns=colonnes_incompletes, index=df.index)
-                df[colonnes_incompletes] = df_imputed
-        else:
-            st.info("✅ Aucune colonne sélectionnée ne nécessite d'imputation.")
-
+        n_neighbors = st.number_input(
+            "Nombre de voisins (K) :",
+            min_value=1, max_value=20, value=3,
+            help="Le nombre de voisins pour l'imputation KNN."
+        )
+        mode_knn = st.radio(
+            "Recherche des voisins :",
+            list(MODES_KNN),
+            help="La recherche exacte parcourt toutes les lignes incomplètes : elle ralentit quand elles sont nombreuses. "
+                 "La recherche approximative ne parcourt que les cellules de l'index les plus proches de chaque ligne ; "
+                 "si elle ne gagne rien sur la recherche exacte (beaucoup de valeurs manquantes), celle-ci est utilisée."
+        )
     elif methode_na == "Imputation par régression":
-        from sklearn.experimental import enable_iterative_imputer  # noqa
-        from sklearn.impute import IterativeImputer
-        colonnes_incompletes = [col for col in colonnes_choisies if df[col].isna().any()]
-        if colonnes_incompletes:
-            max_iter = st.number_input(
-                "Nombre maximal d'itérations :",
-                min_value=1, max_value=50, value=10,
-                help="Le nombre maximal d'itérations pour l'imputation itérative."
-            )
-            imputer = IterativeImputer(random_state=0, max_iter=int(max_iter))
-            with st.spinner("Imputation itérative en cours…"):
-                arr = imputer.fit_transform(df[colonnes_incompletes])
-                df_imputed = pd.DataFrame(arr, columns=colonnes_incompletes, index=df.index)
-                df[colonnes_incompletes] = df_imputed
+        max_iter = st.number_input(
+            "Nombre maximal d'itérations :",
+            min_value=1, max_value=50, value=10,
+            help="Le nombre maximal d'itérations pour l'imputation itérative."
+        )
+
+    parametres_imputation = {
+        "colonnes": colonnes_choisies,
+        "methode": METHODES_NA[methode_na],
+        "n_neighbors": int(n_neighbors),
+        "max_iter": int(max_iter),
+        "knn_mode": MODES_KNN[mode_knn]
+    }
+    etape = source.then("imputation", parametres_imputation, lambda d: imputer(d, **parametres_imputation))
+    try:
+        with st.spinner("Traitement des valeurs manquantes en cours…"):
+            df = etape.result
+    except Exception as e:
+        st.error(f"❌ Erreur lors du traitement des valeurs manquantes : {e}")
+        st.stop()
+
+    if methode_na == "Imputation KNN" and colonnes_incompletes:
+        with st.expander("🎯 Qualité de la recherche des voisins"):
+            parametres_rappel = {
+                "colonnes": colonnes_incompletes,
+                "n_neighbors": int(n_neighbors),
+                "knn_mode": MODES_KNN[mode_knn]
+            }
+            rappel = source.then("rappel_knn", parametres_rappel, lambda d: rappel_knn(d, **parametres_rappel)).result
+            st.metric("Voisins de KNNImputer retrouvés (rappel)", f"{rappel:.1%}")
+
+    if methode_na == "Supprimer les colonnes":
+        colonnes_supprimees = [col for col in colonnes_choisies if col not in df.columns]
+        if colonnes_supprimees:
+            colonnes_choisies = [col for col in colonnes_choisies if col in df.columns]
+            st.warning(f"🗑️ Colonnes supprimées : {', '.join(colonnes_supprimees)}")
         else:
-            st.info("✅ Aucune colonne sélectionnée ne nécessite d'imputation.")
+            st.info("✅ Aucune des colonnes sélectionnées ne contient de valeur manquante.")
 
     # ✅ Comparaison avant/après
     with st.expander("📊 Aperçu des valeurs manquantes avant/après"):
-        avant = df_avant[colonnes_choisies].isna().sum()
-        apres = df[colonnes_choisies].isna().sum()
+        avant = na_avant[colonnes_choisies]
+        apres = etape.then(
+            "valeurs_manquantes", {"colonnes": colonnes_choisies},
+            lambda d: valeurs_manquantes(d, colonnes_choisies)
+        ).result
         comparaison = pd.DataFrame({
             "Avant traitement": avant,
             "Après traitement": apres
@@ -143,25 +192,15 @@ if colonnes_choisies:
     st.markdown("### ⚖️ Normalisation des colonnes")
     normalisation = st.selectbox(
         "Méthode de normalisation :",
-        [
-            "Aucune",
-            "Min-Max (0 → 1)",
-            "Z-score (moyenne 0, écart-type 1)",
-            "RobustScaler (par médiane et IQR)"
-        ],
+        list(NORMALISATIONS),
         help="Choisissez une méthode de normalisation pour les colonnes traitées."
     )
 
-    if normalisation != "Aucune":
-        scaler = (
-            MinMaxScaler()    if normalisation.startswith("Min-Max") else
-            StandardScaler() if normalisation.startswith("Z-score") else
-            RobustScaler()
-        )
+    if NORMALISATIONS[normalisation] is not None:
+        parametres_normalisation = {"colonnes": colonnes_choisies, "methode": NORMALISATIONS[normalisation]}
+        etape = etape.then("normalisation", parametres_normalisation, lambda d: normaliser(d, **parametres_normalisation))
         with st.spinner("Application de la normalisation…"):
-            arr = scaler.fit_transform(df[colonnes_choisies])
-            df_scaled = pd.DataFrame(arr, columns=colonnes_choisies, index=df.index)
-            df[colonnes_choisies] = df_scaled
+            df = etape.result
         st.success(f"📊 Normalisation appliquée : {normalisation}")
     else:
         st.info("Aucune normalisation appliquée.")
@@ -175,11 +214,19 @@ st.dataframe(df)
 
 # Option : stocker pour future utilisation
 st.session_state["df_pretraite"] = df
+st.session_state["df_pretraite_cle"] = etape.key
+
+# L'encodage CSV n'est construit que sur demande, puis mémorisé comme les autres étapes.
+export = etape.then("export_csv", {}, lambda d: d.to_csv(index=False).encode("utf-8"))
+if st.button("📦 Préparer le fichier à télécharger") or st.session_state.get("export_pret") == export.key:
+    st.session_state["export_pret"] = export.key
+    with st.spinner("Préparation du fichier…"):
+        csv = export.result
+    st.download_button(
+        "💾 Télécharger les données nettoyées",
+        csv,
+        file_name="donnees_traitees.csv",
+        mime="text/csv"
+    )
 
-csv = df.to_csv(index=False).encode("utf-8")
-st.download_button(
-    "💾 Télécharger les données nettoyées",
-    csv,
-    file_name="donnees_traitees.csv",
-    mime="text/csv"
-)
+show_measures(mesures)
@@ -1,9 +1,13 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-from pathlib import Path
+
+from src.classes.upload_store import touch_session_upload
+from src.classes.visualizer import Visualizer
+from src.functions.instrumentation import measure, show_measures, start_collecting
 
 st.set_page_config(page_title="Visualisation", layout="centered")
+mesures = start_collecting()
+touch_session_upload(st.session_state)
 st.title("📊 Partie III : Visualisation des données nettoyées")
 
 # ✅ Choix de la source des données
@@ -15,10 +19,12 @@ source = st.radio(
 )
 
 df = None
+cle = None
 
 if source == "Réutiliser les données pré-traitées":
     if "df_pretraite" in st.session_state:
         df = st.session_state["df_pretraite"]
+        cle = st.session_state.get("df_pretraite_cle")
         st.success("✅ Données pré-traitées chargées depuis la session.")
         st.markdown(f"📏 **Dimensions :** {df.shape[0]} lignes × {df.shape[1]} colonnes")
     else:
@@ -75,25 +81,34 @@ graphique = st.radio(
 )
 
 # ✅ Génération des graphiques
+# Les statistiques de toutes les colonnes sont calculées en un passage, et
+# les images déjà rendues pour ce jeu de données sont reprises du cache.
+visualiseur = Visualizer(df, key=cle)
+emplacements = {}
+bins = {}
 for col in selection:
-    fig, ax = plt.subplots()
     if graphique == "Histogramme":
-        bins = st.slider(
+        bins[col] = st.slider(
             f"Nombre de bins pour {col}",
             min_value=5,
             max_value=100,
             value=30,
             help="Ajustez le nombre de bins pour l'histogramme."
         )
-        ax.hist(df[col].dropna(), bins=bins)
-        ax.set_title(f"Histogramme de {col}")
-        ax.set_xlabel(col)
-        ax.set_ylabel("Effectif")
+    emplacements[col] = st.empty()
+
+with measure(f"graphiques ({graphique.lower()})", rows=len(df), columns=len(selection)):
+    if graphique == "Histogramme":
+        images = visualiseur.histogram_pngs(selection, bins)
     else:
-        ax.boxplot(df[col].dropna(), vert=True)
-        ax.set_title(f"Boîte à moustaches de {col}")
-        ax.set_ylabel(col)
+        images = visualiseur.boxplot_pngs(selection)
 
-    st.pyplot(fig)
+for col in selection:
+    if col in images:
+        emplacements[col].image(images[col])
+    else:
+        emplacements[col].info(f"Aucune valeur renseignée pour {col}.")
 
 st.success("🎉 Visualisations générées !")
+
+show_measures(mesures)
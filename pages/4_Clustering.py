@@ -1,13 +1,16 @@
-from matplotlib import pyplot as plt
-from sklearn.decomposition import PCA
+import numpy as np
 import streamlit as st
-import pandas as pd
-import seaborn as sns
 
-from src.classes.prediction import Prediction
 from src.classes.clustering import Clustering
+from src.classes.job_queue import clustering_job, get_job_queue, prediction_job
+from src.classes.model_registry import get_model_registry
+from src.classes.upload_store import touch_session_upload
+from src.functions.fingerprint import frame_fingerprint
+from src.functions.instrumentation import show_measures, start_collecting
 
 st.set_page_config(page_title="Pré-traitement", layout="centered")
+mesures = start_collecting()
+touch_session_upload(st.session_state)
 st.title("Partie IV : Clustering ou prédiction")
 
 df = st.session_state.get("df", None)
@@ -20,10 +23,27 @@ else:
     st.warning("⚠️ Aucune donnée trouvée. Retournez à l'étape d'upload.")
     st.stop()
 
+ENCODAGES = {
+    "One-hot (creux)": "onehot",
+    "Hachage": "hashing",
+    "Encodage par la cible": "target",
+    "Fréquence des modalités": "frequency"
+}
+
+LIAISONS = {
+    "Ward": "ward",
+    "Complète": "complete",
+    "Moyenne": "average",
+    "Simple": "single"
+}
+
+registry = get_model_registry()
+dataset_key = st.session_state.get("dataset_key") or frame_fingerprint(df)
+
 mode = st.radio("Souhaitez-vous effectuer :", options=["Clustering", "Prédiction"])
 
 if mode == "Clustering":
-    num_cols = df.select_dtypes(include=["float64", "int64"]).columns.tolist()
+    num_cols = df.select_dtypes(include="number").columns.tolist()
     if not num_cols:
         st.error("❌ Aucune colonne numérique disponible pour le clustering.")
         st.stop()
@@ -32,8 +52,11 @@ if mode == "Clustering":
     selected_cols = st.multiselect("Sélectionnez les colonnes à utiliser", options=num_cols, default=num_cols)
 
     if selected_cols:
-        clustering = Clustering(df)
-        clustering.set_features(selected_cols)
+        def donnees_reduites():
+            # Mise à l'échelle faite seulement si une exploration est lancée.
+            clustering = Clustering(df)
+            clustering.set_features(selected_cols)
+            return clustering
 
         st.markdown("### ⚙️ Choix de l'algorithme de clustering")
 
@@ -43,25 +66,51 @@ if mode == "Clustering":
         )
 
         if algo == "K-Means":
+            with st.expander("🔎 Explorer plusieurs valeurs de K"):
+                k_min, k_max = st.slider("Valeurs de K à tester", min_value=2, max_value=20, value=(2, 10))
+                early_stopping = st.checkbox("Arrêt anticipé si la silhouette ne s'améliore plus", value=False)
+                if st.button("📐 Comparer les valeurs de K"):
+                    with st.spinner("Exploration en cours..."):
+                        sweep = donnees_reduites().sweep_kmeans(range(k_min, k_max + 1), early_stopping=early_stopping)
+                    st.dataframe(sweep)
+                    st.line_chart(sweep.set_index("n_clusters")[["inertia"]])
+                    st.line_chart(sweep.set_index("n_clusters")[["silhouette", "davies_bouldin"]])
+                    if sweep["silhouette"].notna().any():
+                        best_k = int(sweep.loc[sweep["silhouette"].idxmax(), "n_clusters"])
+                        st.info(f"💡 Meilleure silhouette pour K = {best_k}")
             n_clusters = st.slider("Nombre de clusters (K)", min_value=2, max_value=10, value=3)
         elif algo == "DBSCAN":
+            with st.expander("🔎 Explorer une grille de paramètres"):
+                eps_min, eps_max = st.slider("Plage de ε", min_value=0.1, max_value=10.0, value=(0.2, 2.0), step=0.1)
+                n_eps = st.slider("Nombre de valeurs de ε", min_value=2, max_value=10, value=5)
+                grid_min_samples = st.multiselect("Valeurs de min. samples", options=list(range(1, 11)), default=[5])
+                if st.button("📐 Comparer les paramètres") and grid_min_samples:
+                    with st.spinner("Exploration en cours..."):
+                        sweep = donnees_reduites().sweep_dbscan(np.linspace(eps_min, eps_max, n_eps), grid_min_samples)
+                    st.dataframe(sweep)
             eps = st.slider("ε (rayon de voisinage)", min_value=0.1, max_value=10.0, value=0.5, step=0.1)
             min_samples = st.slider("Min. samples", min_value=1, max_value=10, value=5)
         elif algo == "HCA (Hierarchical Clustering)":
             n_clusters = st.slider("Nombre de clusters", min_value=2, max_value=10, value=3)
+            linkage = LIAISONS[st.selectbox("Méthode d'agrégation", list(LIAISONS))]
+            st.caption("L'arbre de fusion est calculé une fois : changer le nombre de clusters ne le recalcule pas.")
 
         if st.button("🚀 Lancer le clustering"):
             try:
-                if algo == "K-Means":
-                    clustering.run_kmeans(n_clusters=n_clusters)
-                elif algo == "DBSCAN":
-                    clustering.run_dbscan(eps=eps, min_samples=min_samples)
+                if algo == "DBSCAN":
+                    parametres = {"eps": eps, "min_samples": min_samples}
                 elif algo == "HCA (Hierarchical Clustering)":
-                    clustering.run_hca(n_clusters=n_clusters)
+                    parametres = {"n_clusters": n_clusters, "linkage": linkage}
+                else:
+                    parametres = {"n_clusters": n_clusters}
+                cle = registry.key("clustering", dataset_key, colonnes=selected_cols, algo=algo, **parametres)
+                job_id = get_job_queue().submit(clustering_job, df, selected_cols, algo, parametres, cle, key=cle)
 
                 st.session_state["modele_type"] = "clustering"
-                st.session_state["modele_objet"] = clustering
-                st.success("✅ Clustering terminé. Redirection vers l’évaluation...")
+                st.session_state["job_id"] = job_id
+                st.session_state.pop("modele_cle", None)
+                st.session_state.pop("mesures_entrainement", None)
+                st.success("✅ Clustering lancé en arrière-plan. Redirection vers l’évaluation...")
                 st.switch_page("pages/5_Évaluation_du_résultat.py")
 
             except Exception as e:
@@ -77,30 +126,51 @@ elif mode == "Prédiction":
         
         algo = None
         model_params = {}
+        optimiser = st.checkbox(
+            "🔧 Optimiser les hyperparamètres (validation croisée)",
+            help="Recherche sur une grille de paramètres avec élimination progressive des moins bons candidats."
+        )
 
         if task_type == "Classification":
-            algo = st.selectbox("Choix de l'algorithme", ["Random Forest", "Logistic Regression"])
-            if algo == "Random Forest":
+            algo = st.selectbox("Choix de l'algorithme", ["Random Forest", "Logistic Regression", "SGD (incrémental)"])
+            if algo == "Random Forest" and not optimiser:
                 model_params["n_estimators"] = st.slider("Nombre d'arbres", 10, 300, 100)
 
         elif task_type == "Régression":
-            algo = st.selectbox("Choix de l'algorithme", ["Régression Linéaire", "Arbre de régression"])
-            if algo == "Arbre de régression":
+            algo = st.selectbox("Choix de l'algorithme", ["Régression Linéaire", "Arbre de régression", "SGD (incrémental)"])
+            if algo == "Arbre de régression" and not optimiser:
                 model_params["max_depth"] = st.slider("Profondeur max", 1, 20, 5)
 
+        if algo in ("Random Forest", "SGD (incrémental)") and not optimiser:
+            st.caption("Si les données complètent celles d'un modèle déjà entraîné, seules les lignes ajoutées sont apprises.")
+
+        encodage = st.selectbox(
+            "Encodage des variables catégorielles",
+            list(ENCODAGES),
+            help="Au-delà de 100 modalités, une variable encodée en one-hot passe automatiquement au hachage."
+        )
+
         if st.button("🚀 Entraîner le modèle"):
             try:
-                predictor = Prediction(df, features=feature_cols, target=target_col, task_type=task_type)
-                predictor.split()
-                predictor.set_model(algo, **model_params)
-                predictor.train()
+                cle = registry.key(
+                    "prediction", dataset_key, features=feature_cols, target=target_col,
+                    task_type=task_type, algo=algo, encoding=ENCODAGES[encodage], tune=optimiser, **model_params
+                )
+                job_id = get_job_queue().submit(
+                    prediction_job, df, feature_cols, target_col, task_type, algo, model_params, cle,
+                    encoding=ENCODAGES[encodage], tune=optimiser, key=cle
+                )
 
                 st.session_state["modele_type"] = "prediction"
-                st.session_state["modele_objet"] = predictor
-                st.success("✅ Modèle entraîné. Redirection vers l’évaluation...")
+                st.session_state["job_id"] = job_id
+                st.session_state.pop("modele_cle", None)
+                st.session_state.pop("mesures_entrainement", None)
+                st.success("✅ Entraînement lancé en arrière-plan. Redirection vers l’évaluation...")
                 st.switch_page("pages/5_Évaluation_du_résultat.py")
 
             except Exception as e:
                 st.error(f"❌ Erreur : {e}")
         else:
-            st.info("Veuillez sélectionner les colonnes d'entrée et la cible.")
\ No newline at end of file
+            st.info("Veuillez sélectionner les colonnes d'entrée et la cible.")
+
+show_measures(mesures)
\ No newline at end of file
@@ -1,14 +1,51 @@
+import importlib.util
+import time
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.decomposition import PCA
+
+from src.classes.job_queue import CANCELLED, FAILED, PENDING, RUNNING, get_job_queue
+from src.classes.model_registry import get_model_registry
+from src.classes.upload_store import touch_session_upload
+from src.classes.visualizer import cached_figure, figure_key, render_dendrogram, render_scatter
+from src.functions.instrumentation import show_measures, start_collecting
 
 st.set_page_config(page_title="Évaluation", layout="centered")
+mesures = start_collecting()
+touch_session_upload(st.session_state)
 st.title("📊 Évaluation du modèle")
 
 modele_type = st.session_state.get("modele_type", None)
-modele = st.session_state.get("modele_objet", None)
+job_id = st.session_state.get("job_id", None)
+
+if job_id is not None:
+    try:
+        job = get_job_queue().status(job_id)
+    except KeyError:
+        st.error("❌ La tâche d'entraînement est introuvable (serveur redémarré ?). Relancez-la depuis l'étape précédente.")
+        st.session_state.pop("job_id")
+        st.stop()
+
+    if job["status"] in (PENDING, RUNNING):
+        st.info("⏳ Entraînement en cours en arrière-plan...")
+        st.progress(job["progress"], text=job["message"] or "En attente d'un processus libre...")
+        if st.button("⛔ Annuler"):
+            get_job_queue().cancel(job_id)
+        time.sleep(1)
+        st.rerun()
+    elif job["status"] == FAILED:
+        st.error(f"❌ Erreur lors de l'entraînement : {job['error']}")
+        st.session_state.pop("job_id")
+        st.stop()
+    elif job["status"] == CANCELLED:
+        st.warning("⛔ Entraînement annulé.")
+        st.session_state.pop("job_id")
+        st.stop()
+    else:
+        st.session_state["modele_cle"] = job["result"]
+        st.session_state["mesures_entrainement"] = job["measures"]
+        st.session_state.pop("job_id")
+
+modele_cle = st.session_state.get("modele_cle", None)
+modele = get_model_registry().get(modele_cle) if modele_cle else None
 
 if modele_type is None or modele is None:
     st.error("❌ Aucun modèle trouvé. Veuillez d'abord exécuter un entraînement.")
@@ -16,20 +53,60 @@ if modele_type is None or modele is None:
 
 if modele_type == "clustering":
     st.subheader("Résultats du Clustering")
+    MODES = {"full": "complet", "minibatch": "mini-lots", "sample": "échantillon", "birch": "pré-agrégation BIRCH",
+             "graph": "graphe de voisinage en cache"}
+    if getattr(modele, "mode", None):
+        st.caption(f"Mode de calcul : {MODES.get(modele.mode, modele.mode)}")
+
+    # CAH : l'arbre de fusion est enregistré avec le modèle, une autre
+    # découpe est immédiate et ne relance pas d'entraînement.
+    n_decoupe = None
+    recoupe = False
+    if getattr(modele, "tree", None) is not None:
+        n_initial = int(modele.labels.max()) + 1
+        n_decoupe = st.slider(
+            "Nombre de clusters (découpe de l'arbre)", min_value=2, max_value=max(20, n_initial), value=max(2, n_initial)
+        )
+        if n_decoupe != n_initial:
+            modele.cut_hca(n_decoupe)
+            recoupe = True
 
     result_df = modele.get_result_dataframe()
     st.dataframe(result_df)
 
-    st.markdown("### 📈 Visualisation PCA des clusters")
-    pca = PCA(n_components=2)
-    reduced = pca.fit_transform(modele.scaled_X)
-    reduced_df = pd.DataFrame(reduced, columns=["PC1", "PC2"])
-    reduced_df["Cluster"] = modele.labels
+    st.markdown("### 📈 Visualisation des clusters")
+    PROJECTIONS = {"ACP": "pca", "t-SNE (échantillon)": "tsne"}
+    if importlib.util.find_spec("umap") is not None:
+        PROJECTIONS["UMAP (échantillon)"] = "umap"
+    projection_choisie = st.selectbox("Projection", list(PROJECTIONS))
+    methode = PROJECTIONS[projection_choisie]
+
+    figure_cle = figure_key(modele_cle, methode, n_decoupe)
+    image = cached_figure(figure_cle)
+    if image is None:
+        deja_calculee = methode in modele.projections
+        with st.spinner("Calcul de la projection…"):
+            projection = modele.get_projection(methode)
+        if not deja_calculee and not recoupe:
+            # Enregistrée avec le modèle pour les visites suivantes.
+            get_model_registry().put(modele_cle, modele)
+        xlabel, ylabel = projection.axis_labels()
+        # Au-delà de quelques dizaines de milliers de points, échantillon stratifié par cluster.
+        image = render_scatter(
+            figure_cle, projection.coords[:, 0], projection.coords[:, 1], labels=projection.sample(modele.labels),
+            title=f"Projection {projection_choisie}", xlabel=xlabel, ylabel=ylabel
+        )
+    st.image(image)
 
-    fig, ax = plt.subplots()
-    sns.scatterplot(data=reduced_df, x="PC1", y="PC2", hue="Cluster", palette="tab10", ax=ax)
-    ax.set_title("Projection PCA")
-    st.pyplot(fig)
+    if n_decoupe is not None:
+        st.markdown("### 🌳 Dendrogramme")
+        dendrogramme_cle = figure_key(modele_cle, "dendrogramme", n_decoupe)
+        image = cached_figure(dendrogramme_cle) or render_dendrogram(
+            dendrogramme_cle, modele.tree, n_clusters=n_decoupe, title=f"CAH ({modele.linkage})"
+        )
+        st.image(image)
+        if modele.mode != "full":
+            st.caption("Les feuilles de l'arbre sont les points de l'échantillon ou les sous-clusters BIRCH.")
 
     try:
         stats = modele.get_cluster_stats()
@@ -43,6 +120,15 @@ elif modele_type == "prediction":
 
     results = modele.evaluate()
     task_type = modele.task_type
+    if getattr(modele, "incremental_rows", 0):
+        st.caption(f"Modèle mis à jour de façon incrémentale : {modele.incremental_rows} lignes ajoutées depuis l'entraînement complet.")
+
+    if getattr(modele, "best_params", None) is not None:
+        st.markdown("### 🔧 Hyperparamètres retenus")
+        st.write(modele.best_params)
+        st.metric("Score moyen en validation croisée", f"{modele.cv_score:.3f}")
+        with st.expander("Détail des candidats évalués"):
+            st.dataframe(modele.cv_results.astype({"params": str}))
 
     if task_type == "classification":
         st.metric("🎯 Accuracy", f"{results['accuracy']:.2%}")
@@ -55,6 +141,8 @@ elif modele_type == "prediction":
         st.metric("📉 MSE", f"{results['mse']:.2f}")
 
         st.markdown("### 📉 Courbe Réel vs Prédit")
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots()
         ax.scatter(modele.y_test, modele.y_pred, alpha=0.6)
         ax.plot([modele.y_test.min(), modele.y_test.max()],
@@ -69,4 +157,6 @@ elif modele_type == "prediction":
     st.dataframe(modele.get_predictions_dataframe())
 
 else:
-    st.warning("Type de modèle non reconnu.")
\ No newline at end of file
+    st.warning("Type de modèle non reconnu.")
+
+show_measures(mesures, job_records=st.session_state.get("mesures_entrainement"))
\ No newline at end of file
@@ -1,31 +1,459 @@
-from sklearn.cluster import KMeans, DBSCAN, AgglomerativeClustering
-from sklearn.preprocessing import StandardScaler
+import hashlib
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.classes.dataset_cache import MemoryLRU
+from src.functions.instrumentation import instrumented
+from src.functions.memory import available_memory
+
+CHUNKSIZE = 10_000
+KMEANS_MAX_ROWS = 50_000
+MINIBATCH_EPOCHS = 3
+HCA_SAMPLE_SIZE = 10_000
+BIRCH_THRESHOLD = 0.5
+# L'arbre CF de BIRCH se dégrade au-delà d'une vingtaine de variables, et
+# chaque doublement du seuil relit toutes les données : au-delà, la CAH part
+# d'un échantillon.
+BIRCH_MAX_FEATURES = 20
+BIRCH_MAX_PASSES = 4
+SILHOUETTE_SAMPLE = 10_000
+GRAPH_DIR = "./cache/graphs"
+GRAPH_CACHE_BYTES = 512 * 1024 * 1024
+GRAPH_DISK_FILES = 8
+GRAPH_EPS_FACTOR = 2.0
+GRAPH_SAMPLE = 1_000
+LINKAGES = ["ward", "complete", "average", "single"]
+LINKAGE_DIR = "./cache/linkages"
+LINKAGE_CACHE_BYTES = 64 * 1024 * 1024
+LINKAGE_DISK_FILES = 16
+
+_shared = {}
+
+def _attach_shared(name, shape, dtype):
+    # Initialisation d'un processus de l'exploration : les données réduites
+    # sont lues dans la mémoire partagée, sans copie ni sérialisation.
+    from threadpoolctl import threadpool_limits
+    shm = shared_memory.SharedMemory(name=name)
+    _shared["shm"] = shm
+    _shared["X"] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    # Un seul thread par processus : le parallélisme vient du pool.
+    _shared["limits"] = threadpool_limits(1)
+
+def _evaluate(algorithm, params, minibatch, sample_size):
+    from sklearn.cluster import DBSCAN, KMeans, MiniBatchKMeans
+
+    X = _shared["X"]
+    if algorithm == "kmeans":
+        if minibatch:
+            model = MiniBatchKMeans(n_clusters=params["n_clusters"], batch_size=CHUNKSIZE, random_state=0, n_init=3)
+        else:
+            model = KMeans(n_clusters=params["n_clusters"], random_state=0)
+        labels = model.fit_predict(X)
+    else:
+        model = DBSCAN(**params)
+        labels = model.fit_predict(X)
+    return _score(X, labels, params, getattr(model, "inertia_", None), sample_size)
+
+def _score(X, labels, params, inertia, sample_size):
+    from sklearn.metrics import davies_bouldin_score, silhouette_score
+
+    # Les points de bruit de DBSCAN sont exclus des scores.
+    kept = labels != -1
+    n_clusters = len(np.unique(labels[kept]))
+    result = dict(params)
+    result.update({
+        "n_clusters": n_clusters,
+        "noise_ratio": float(1 - kept.mean()),
+        "inertia": float(inertia) if inertia is not None else None,
+        "silhouette": None,
+        "davies_bouldin": None
+    })
+    if 2 <= n_clusters < kept.sum():
+        X_kept, labels_kept = X[kept], labels[kept]
+        size = sample_size if len(X_kept) > sample_size else None
+        result["silhouette"] = float(silhouette_score(X_kept, labels_kept, sample_size=size, random_state=0))
+        result["davies_bouldin"] = float(davies_bouldin_score(X_kept, labels_kept))
+    return result
+
+def _dbscan_labels(graph, eps, min_samples):
+    # DBSCAN sur le graphe de voisinage filtré à ε, sans recalcul de distances :
+    # points cœurs, composantes connexes entre cœurs, puis chaque point de
+    # bordure prend le plus petit numéro de cluster voisin. Numérotation et
+    # affectation des bordures sont celles de scikit-learn.
+    n = graph.shape[0]
+    keep = graph.data <= eps
+    # Chaque ligne contient au moins le point lui-même : aucune ligne n'est vide.
+    degree = np.add.reduceat(keep.astype(np.intp), graph.indptr[:-1])
+    rows = np.repeat(np.arange(n), degree)
+    cols = graph.indices[keep]
+    core = degree >= min_samples
+    core_index = np.flatnonzero(core)
+    labels = np.full(n, -1, dtype=np.intp)
+    if not len(core_index):
+        return labels, core_index
+
+    from scipy import sparse
+    from scipy.sparse.csgraph import connected_components
+
+    position = np.cumsum(core) - 1
+    edges = core[rows] & core[cols]
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(position[rows[edges]], minlength=len(core_index)))])
+    core_graph = sparse.csr_matrix(
+        (np.ones(int(edges.sum())), position[cols[edges]], indptr), shape=(len(core_index), len(core_index))
+    )
+    # Pas de doublons : la conversion de scipy n'a pas à retrier les indices.
+    core_graph.has_canonical_format = True
+    # Le graphe est symétrique : composantes fortes et faibles coïncident, sans transposition.
+    _, components = connected_components(core_graph, directed=True, connection="strong")
+    _, first = np.unique(components, return_index=True)
+    rank = np.empty(len(first), dtype=np.intp)
+    rank[np.argsort(first)] = np.arange(len(first))
+    labels[core_index] = rank[components]
+
+    border = ~core[rows] & core[cols]
+    nearest = np.full(n, len(first))
+    np.minimum.at(nearest, rows[border], labels[cols[border]])
+    reached = nearest < len(first)
+    labels[reached] = nearest[reached]
+    return labels, core_index
+
+def _cut_tree(tree, n_clusters=3, distance_threshold=None):
+    # Découpe d'un arbre de fusion (matrice de liaison de scipy) en O(n),
+    # par nombre de clusters ou par seuil de distance. Étiquettes à partir de 0.
+    from scipy.cluster.hierarchy import fcluster
+
+    n = len(tree) + 1
+    if distance_threshold is not None:
+        return fcluster(tree, distance_threshold, criterion="distance") - 1
+    n_clusters = min(max(int(n_clusters), 1), n)
+    # Le critère est le rang de la fusion : les n - n_clusters premières sont
+    # appliquées, d'où exactement n_clusters groupes même à distances égales.
+    rank = np.arange(n - 1, dtype=np.float64)
+    return fcluster(tree, n - n_clusters - 1, criterion="monocrit", monocrit=rank) - 1
+
+def _graph_nbytes(entry):
+    graph = entry[1]
+    return graph.data.nbytes + graph.indices.nbytes + graph.indptr.nbytes
+
+# Graphes de voisinage par jeu de données : (rayon, matrice CSR des distances),
+# et arbres de fusion de la CAH par (points, méthode d'agrégation).
+# En mémoire pour le processus courant, sur disque pour les processus de la file de tâches.
+_radius_graphs = MemoryLRU(GRAPH_CACHE_BYTES, sizeof=_graph_nbytes)
+_linkage_trees = MemoryLRU(LINKAGE_CACHE_BYTES, sizeof=lambda tree: tree.nbytes)
+
+def _load_cached(cache, directory, key):
+    entry = cache.get(key)
+    path = Path(directory) / f"{key}.joblib"
+    if entry is None and path.exists():
+        try:
+            entry = joblib.load(path, mmap_mode="r")
+            cache.put(key, entry)
+        except Exception as e:
+            logging.error(f"Cache illisible {path} : {e}")
+    return entry
+
+def _store_cached(cache, directory, key, entry, max_files):
+    cache.put(key, entry)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{key}.joblib"
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        joblib.dump(entry, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    # Seules les entrées les plus récentes sont gardées sur disque.
+    for old in sorted(directory.glob("*.joblib"), key=lambda p: p.stat().st_mtime)[:-max_files]:
+        old.unlink(missing_ok=True)
+
+def _linkage_tree(points, method):
+    # Arbre de fusion complet, calculé une fois par (points, méthode d'agrégation).
+    from scipy.cluster.hierarchy import linkage
+
+    key = f"{hashlib.sha256(np.ascontiguousarray(points)).hexdigest()}_{method}"
+    tree = _load_cached(_linkage_trees, LINKAGE_DIR, key)
+    if tree is None:
+        tree = linkage(points, method=method)
+        _store_cached(_linkage_trees, LINKAGE_DIR, key, tree, LINKAGE_DISK_FILES)
+    return tree
 
 class Clustering:
     def __init__(self, dataframe):
         self.df = dataframe
         self.X = None
         self.labels = None
+        self.model = None
+        self.mode = None
+        self.projections = {}
+        self.data_key = None
+        self.tree = None
+        self.leaves = None
+        self.linkage = None
+
+    def __getstate__(self):
+        # Le DataFrame complet n'est pas conservé avec le modèle enregistré.
+        state = self.__dict__.copy()
+        state["df"] = None
+        return state
 
     def set_features(self, columns):
+        from sklearn.preprocessing import StandardScaler
+
         self.X = self.df[columns].dropna()
         self.scaled_X = StandardScaler().fit_transform(self.X)
+        self.projections = {}
+        self.data_key = None
+        self.tree = None
+        self.leaves = None
+        self.linkage = None
+
+    def get_projection(self, method="pca"):
+        # Calculée au premier appel puis conservée avec le modèle enregistré.
+        from src.classes.projection import Projection
+
+        if method not in self.projections:
+            self.projections[method] = Projection(method).fit(self.scaled_X, self.labels)
+        return self.projections[method]
+
+    def _chunks(self):
+        for start in range(0, len(self.scaled_X), CHUNKSIZE):
+            yield self.scaled_X[start:start + CHUNKSIZE]
+
+    def _predict_in_chunks(self, model):
+        return np.concatenate([model.predict(chunk) for chunk in self._chunks()])
+
+    def select_mode(self, algorithm):
+        # Choix automatique selon le nombre de lignes et la mémoire disponible.
+        n = len(self.scaled_X)
+        if algorithm == "kmeans":
+            return "minibatch" if n > KMEANS_MAX_ROWS else "full"
+        if algorithm == "hca":
+            # La CAH complète manipule une matrice de distances condensée.
+            needed = n * (n - 1) // 2 * 8
+            available = available_memory()
+            if n <= HCA_SAMPLE_SIZE or (available is not None and needed < available // 4):
+                return "full"
+            return "sample" if self.scaled_X.shape[1] > BIRCH_MAX_FEATURES else "birch"
+        raise ValueError("Algorithme non reconnu.")
 
-    def run_kmeans(self, n_clusters=3):
-        model = KMeans(n_clusters=n_clusters)
-        self.labels = model.fit_predict(self.scaled_X)
+    @instrumented("clustering K-Means", data=lambda self, *args, **kwargs: self.scaled_X)
+    def run_kmeans(self, n_clusters=3, mode="auto"):
+        from sklearn.cluster import KMeans, MiniBatchKMeans
+
+        self.mode = self.select_mode("kmeans") if mode == "auto" else mode
+        if self.mode == "full":
+            self.model = KMeans(n_clusters=n_clusters)
+            self.labels = self.model.fit_predict(self.scaled_X)
+        elif self.mode == "minibatch":
+            self.model = MiniBatchKMeans(n_clusters=n_clusters, batch_size=CHUNKSIZE, random_state=0, n_init=3)
+            rng = np.random.default_rng(0)
+            starts = np.arange(0, len(self.scaled_X), CHUNKSIZE)
+            for _ in range(MINIBATCH_EPOCHS):
+                for start in rng.permutation(starts):
+                    self.model.partial_fit(self.scaled_X[start:start + CHUNKSIZE])
+            self.labels = self._predict_in_chunks(self.model)
+        else:
+            raise ValueError("Mode K-Means non reconnu.")
         return self.labels
 
-    def run_dbscan(self, eps=0.5, min_samples=5):
-        model = DBSCAN(eps=eps, min_samples=min_samples)
-        self.labels = model.fit_predict(self.scaled_X)
+    def _data_key(self):
+        if self.data_key is None:
+            self.data_key = hashlib.sha256(np.ascontiguousarray(self.scaled_X)).hexdigest()
+        return self.data_key
+
+    def _graph_bytes(self, neighbors, radius):
+        # Taille estimée du graphe d'après le nombre moyen de voisins d'un échantillon.
+        n = len(self.scaled_X)
+        rng = np.random.default_rng(0)
+        sample = rng.choice(n, size=min(GRAPH_SAMPLE, n), replace=False)
+        counts = [len(row) for row in neighbors.radius_neighbors(
+            self.scaled_X[sample], radius=radius, return_distance=False
+        )]
+        return int(np.mean(counts) * n * 16 + (n + 1) * 8)
+
+    def radius_graph(self, radius, n_jobs=-1):
+        # Graphe des voisins à distance ≤ rayon, calculé une fois par jeu de
+        # données puis réutilisé pour tout ε plus petit. Il est construit avec
+        # une marge (GRAPH_EPS_FACTOR) pour servir les réglages voisins, dans
+        # la limite de la mémoire ; None s'il serait trop volumineux.
+        key = self._data_key()
+        entry = _load_cached(_radius_graphs, GRAPH_DIR, key)
+        if entry is not None and entry[0] >= radius:
+            return entry[1]
+
+        from sklearn.neighbors import NearestNeighbors
+
+        neighbors = NearestNeighbors(n_jobs=n_jobs).fit(self.scaled_X)
+        budget = GRAPH_CACHE_BYTES
+        available = available_memory()
+        if available is not None:
+            budget = min(budget, available // 4)
+        for candidate in (radius * GRAPH_EPS_FACTOR, radius):
+            if self._graph_bytes(neighbors, candidate) <= budget:
+                # Le point lui-même (distance 0) est gardé : DBSCAN le compte dans `min_samples`.
+                graph = neighbors.radius_neighbors_graph(self.scaled_X, radius=candidate, mode="distance")
+                _store_cached(_radius_graphs, GRAPH_DIR, key, (candidate, graph), GRAPH_DISK_FILES)
+                return graph
+        return None
+
+    @instrumented("clustering DBSCAN", data=lambda self, *args, **kwargs: self.scaled_X)
+    def run_dbscan(self, eps=0.5, min_samples=5, max_eps=None):
+        from sklearn.cluster import DBSCAN
+
+        graph = self.radius_graph(max(eps, max_eps or eps))
+        if graph is None:
+            self.mode = "full"
+            self.model = DBSCAN(eps=eps, min_samples=min_samples, n_jobs=-1)
+            self.labels = self.model.fit_predict(self.scaled_X)
+            return self.labels
+        self.mode = "graph"
+        self.labels, core_index = _dbscan_labels(graph, eps, min_samples)
+        # Modèle équivalent à un DBSCAN ajusté sur les données.
+        self.model = DBSCAN(eps=eps, min_samples=min_samples)
+        self.model.labels_ = self.labels
+        self.model.core_sample_indices_ = core_index
+        self.model.components_ = self.scaled_X[core_index]
         return self.labels
 
-    def run_hca(self, n_clusters=3):
-        model = AgglomerativeClustering(n_clusters=n_clusters)
-        self.labels = model.fit_predict(self.scaled_X)
+    @instrumented("clustering CAH", data=lambda self, *args, **kwargs: self.scaled_X)
+    def run_hca(self, n_clusters=3, mode="auto", linkage="ward", distance_threshold=None):
+        # L'arbre de fusion est construit une fois par (variables, méthode
+        # d'agrégation) ; chaque nombre de clusters n'en est qu'une découpe.
+        if linkage not in LINKAGES:
+            raise ValueError("Méthode d'agrégation non reconnue.")
+        self.mode = self.select_mode("hca") if mode == "auto" else mode
+        self.linkage = linkage
+        if self.mode not in ("full", "sample", "birch"):
+            raise ValueError("Mode CAH non reconnu.")
+        if self.mode == "birch":
+            points = self._birch_subclusters()
+            if points is None:
+                # Trop de sous-clusters après BIRCH_MAX_PASSES passages : échantillon.
+                self.mode = "sample"
+                self.model = None
+        if self.mode == "full":
+            points = self.scaled_X
+        elif self.mode == "sample":
+            rng = np.random.default_rng(0)
+            self.leaves = rng.choice(len(self.scaled_X), size=min(HCA_SAMPLE_SIZE, len(self.scaled_X)), replace=False)
+            points = self.scaled_X[self.leaves]
+        self.tree = _linkage_tree(points, linkage)
+        return self.cut_hca(n_clusters, distance_threshold)
+
+    def cut_hca(self, n_clusters=3, distance_threshold=None):
+        # Nouvelle découpe de l'arbre déjà construit, sans nouvel ajustement.
+        from sklearn.cluster import AgglomerativeClustering
+        from sklearn.metrics import pairwise_distances_argmin
+
+        if self.tree is None:
+            raise RuntimeError("Aucune CAH effectuée.")
+        tree_labels = _cut_tree(self.tree, n_clusters, distance_threshold)
+        if self.mode == "full":
+            self.labels = tree_labels
+            self.model = AgglomerativeClustering(
+                n_clusters=None if distance_threshold is not None else n_clusters,
+                linkage=self.linkage, distance_threshold=distance_threshold
+            )
+            self.model.labels_ = tree_labels
+            self.model.n_clusters_ = int(tree_labels.max()) + 1
+            self.model.children_ = self.tree[:, :2].astype(np.intp)
+            self.model.distances_ = np.asarray(self.tree[:, 2])
+        elif self.mode == "sample":
+            # CAH sur un échantillon représentatif, puis chaque ligne rejoint le
+            # cluster dont le centre de l'échantillon est le plus proche.
+            sample = self.scaled_X[self.leaves]
+            centers = np.vstack([sample[tree_labels == c].mean(axis=0) for c in range(tree_labels.max() + 1)])
+            self.labels = np.concatenate([pairwise_distances_argmin(chunk, centers) for chunk in self._chunks()])
+            self.labels[self.leaves] = tree_labels
+        else:
+            # Chaque ligne suit son sous-cluster BIRCH ; `predict` reste cohérent.
+            self.model.subcluster_labels_ = tree_labels
+            self.labels = tree_labels[self.leaves]
+            self.model.labels_ = self.labels
         return self.labels
 
+    def _birch_subclusters(self):
+        # Pré-agrégation en arbre CF : la CAH ne porte que sur les sous-clusters.
+        # None si leur nombre dépasse encore HCA_SAMPLE_SIZE après BIRCH_MAX_PASSES.
+        from sklearn.cluster import Birch
+
+        threshold = BIRCH_THRESHOLD
+        for _ in range(BIRCH_MAX_PASSES):
+            self.model = Birch(threshold=threshold, n_clusters=None)
+            for chunk in self._chunks():
+                self.model.partial_fit(chunk)
+            if len(self.model.subcluster_centers_) <= HCA_SAMPLE_SIZE:
+                break
+            threshold *= 2
+        else:
+            return None
+        # Sans étape globale, `predict` donne l'indice du sous-cluster le plus proche.
+        self.leaves = self._predict_in_chunks(self.model)
+        return self.model.subcluster_centers_
+
+    @instrumented("exploration K-Means", data=lambda self, *args, **kwargs: self.scaled_X)
+    def sweep_kmeans(self, k_values=range(2, 11), early_stopping=False, patience=2, n_jobs=None,
+                     sample_size=SILHOUETTE_SAMPLE):
+        # Avec early_stopping, l'exploration s'arrête dès que la silhouette
+        # ne s'améliore plus pendant `patience` valeurs de K consécutives.
+        minibatch = self.select_mode("kmeans") == "minibatch"
+        configs = [("kmeans", {"n_clusters": int(k)}, minibatch) for k in sorted(k_values)]
+        return self._sweep(configs, early_stopping, patience, n_jobs, sample_size)
+
+    @instrumented("exploration DBSCAN", data=lambda self, *args, **kwargs: self.scaled_X)
+    def sweep_dbscan(self, eps_values, min_samples_values=(5,), n_jobs=None, sample_size=SILHOUETTE_SAMPLE):
+        # Un seul graphe de voisinage, au plus grand ε : chaque configuration
+        # ne fait que le filtrer, sans nouveau calcul de distances.
+        configs = [{"eps": float(eps), "min_samples": int(m)} for eps in eps_values for m in min_samples_values]
+        graph = self.radius_graph(max(config["eps"] for config in configs), n_jobs=n_jobs or -1)
+        if graph is None:
+            return self._sweep([("dbscan", config, False) for config in configs], False, None, n_jobs, sample_size)
+        results = []
+        for config in configs:
+            labels, _ = _dbscan_labels(graph, config["eps"], config["min_samples"])
+            results.append(_score(self.scaled_X, labels, config, None, sample_size))
+        return pd.DataFrame(results)
+
+    def _sweep(self, configs, early_stopping, patience, n_jobs, sample_size):
+        X = np.ascontiguousarray(self.scaled_X)
+        shm = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+        try:
+            np.ndarray(X.shape, dtype=X.dtype, buffer=shm.buf)[:] = X
+            n_jobs = min(n_jobs or os.cpu_count() or 1, len(configs))
+            results = []
+            best, stale = None, 0
+            with ProcessPoolExecutor(
+                max_workers=n_jobs, initializer=_attach_shared, initargs=(shm.name, X.shape, X.dtype.str)
+            ) as pool:
+                futures = [pool.submit(_evaluate, *config, sample_size) for config in configs]
+                for future in futures:
+                    result = future.result()
+                    results.append(result)
+                    if not early_stopping:
+                        continue
+                    score = result["silhouette"]
+                    if score is not None and (best is None or score > best):
+                        best, stale = score, 0
+                    else:
+                        stale += 1
+                    if stale >= patience:
+                        for pending in futures:
+                            pending.cancel()
+                        break
+        finally:
+            shm.close()
+            shm.unlink()
+        return pd.DataFrame(results)
+
     def get_result_dataframe(self):
         if self.labels is not None:
             result_df = self.X.copy()
@@ -43,7 +471,6 @@ class Clustering:
         return stats
 
     def get_centroids(self):
-        from sklearn.cluster import KMeans
-        if not isinstance(self.model, KMeans):
+        if not hasattr(self.model, "cluster_centers_"):
             raise RuntimeError("Les centroïdes ne sont disponibles que pour KMeans.")
-        return self.model.cluster_centers_
\ No newline at end of file
+        return self.model.cluster_centers_
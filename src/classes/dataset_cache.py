@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+
+from src.functions.fingerprint import file_fingerprint
+
+CACHE_DIR = "./cache/datasets"
+MEMORY_BUDGET = 512 * 1024 * 1024
+DISK_BUDGET = int(os.environ.get("DATASET_CACHE_BYTES", 4 * 1024 * 1024 * 1024))
+# Incrémenté quand la lecture change les types produits : les jeux mis en
+# cache par une version précédente ne sont plus relus.
+FORMAT_VERSION = 2
+
+def frame_nbytes(df):
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+class MemoryLRU:
+    def __init__(self, max_bytes, sizeof=frame_nbytes):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.items = OrderedDict()
+        self.sizes = {}
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.items
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                return default
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, value, size=None):
+        size = self.sizeof(value) if size is None else size
+        with self.lock:
+            if key in self.items:
+                self.used -= self.sizes.pop(key)
+                del self.items[key]
+            if size > self.max_bytes:
+                return
+            self.items[key] = value
+            self.sizes[key] = size
+            self.used += size
+            while self.used > self.max_bytes:
+                old_key, _ = self.items.popitem(last=False)
+                self.used -= self.sizes.pop(old_key)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                return default
+            self.used -= self.sizes.pop(key)
+            return self.items.pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.sizes.clear()
+            self.used = 0
+
+class DatasetCache:
+    # Deux niveaux : mémoire (LRU borné en octets) et Parquet sur disque,
+    # borné lui aussi : les fichiers les moins récemment lus (atime, mis à
+    # jour à chaque lecture) sont supprimés au-delà de `max_disk_bytes`.
+    def __init__(self, directory=CACHE_DIR, max_memory_bytes=MEMORY_BUDGET, max_disk_bytes=DISK_BUDGET):
+        self.directory = Path(directory)
+        self.memory = MemoryLRU(max_memory_bytes)
+        self.max_disk_bytes = max_disk_bytes
+        self.lock = threading.Lock()
+
+    def key(self, path, read_options):
+        options = f"{file_fingerprint(path)}|{read_options!r}|{FORMAT_VERSION}"
+        return hashlib.sha256(options.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key):
+        return self.directory / f"{key}.parquet"
+
+    def _touch(self, path):
+        # Seule la date d'accès change, comme pour les fichiers envoyés.
+        try:
+            stat = os.stat(path)
+            os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def get(self, key):
+        df = self.memory.get(key)
+        disk_path = self._disk_path(key)
+        found_on_disk = self._touch(disk_path)
+        if df is None:
+            if not found_on_disk:
+                return None
+            try:
+                df = pd.read_parquet(disk_path)
+            except Exception as e:
+                logging.error(f"Cache illisible {disk_path} : {e}")
+                return None
+            self.memory.put(key, df)
+        # Copie superficielle : les pages peuvent remplacer des colonnes sans
+        # modifier le DataFrame partagé.
+        return df.copy(deep=False)
+
+    def put(self, key, df):
+        self.memory.put(key, df)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        disk_path = self._disk_path(key)
+        tmp_path = disk_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, disk_path)
+            self.sweep(keep=disk_path)
+        except ImportError:
+            # Sans pyarrow, seul le niveau mémoire est disponible.
+            pass
+        except Exception as e:
+            logging.error(f"Impossible d'écrire le cache {disk_path} : {e}")
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def sweep(self, keep=None):
+        # Supprime les fichiers les moins récemment lus jusqu'à revenir sous le
+        # budget disque. Renvoie le nombre d'octets libérés.
+        with self.lock:
+            entries = []
+            for path in self.directory.glob("*.parquet"):
+                try:
+                    entries.append((path, path.stat()))
+                except FileNotFoundError:
+                    pass
+            entries.sort(key=lambda entry: entry[1].st_atime)
+            used = sum(stat.st_size for _, stat in entries)
+            freed = 0
+            for path, stat in entries:
+                if used - freed <= self.max_disk_bytes:
+                    break
+                if path == keep:
+                    continue
+                path.unlink(missing_ok=True)
+                freed += stat.st_size
+        return freed
+
+    def invalidate(self, key):
+        self.memory.pop(key)
+        disk_path = self._disk_path(key)
+        if disk_path.exists():
+            disk_path.unlink()
+
+_dataset_cache = None
+_dataset_cache_lock = threading.Lock()
+
+def get_dataset_cache():
+    global _dataset_cache
+    with _dataset_cache_lock:
+        if _dataset_cache is None:
+            _dataset_cache = DatasetCache()
+        return _dataset_cache
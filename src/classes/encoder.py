@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.utils import murmurhash3_32
+
+METHODS = ["onehot", "hashing", "target", "frequency"]
+MAX_CARDINALITY = 100
+N_HASH_FEATURES = 1024
+
+def is_categorical(series):
+    return (
+        isinstance(series.dtype, pd.CategoricalDtype)
+        or pd.api.types.is_object_dtype(series)
+        or pd.api.types.is_string_dtype(series)
+    )
+
+class CategoricalEncoder(TransformerMixin, BaseEstimator):
+    # Encodage appris sur le jeu d'entraînement et rejoué tel quel ensuite.
+    # La sortie est une matrice CSR : variables numériques, puis un bloc par
+    # méthode. Au-delà de `max_cardinality` modalités, une variable passe au
+    # hachage pour que le nombre de colonnes reste borné.
+    def __init__(self, method="onehot", max_cardinality=MAX_CARDINALITY, n_hash_features=N_HASH_FEATURES,
+                 random_state=0):
+        self.method = method
+        self.max_cardinality = max_cardinality
+        self.n_hash_features = n_hash_features
+        self.random_state = random_state
+
+    def _split_columns(self, X):
+        self.numeric_columns_ = [col for col in X.columns if not is_categorical(X[col])]
+        self.categorical_columns_ = [col for col in X.columns if is_categorical(X[col])]
+        self.onehot_columns_, self.hashed_columns_, self.encoded_columns_ = [], [], []
+        for col in self.categorical_columns_:
+            if self.method == "hashing" or (
+                self.method == "onehot" and X[col].nunique(dropna=True) > self.max_cardinality
+            ):
+                self.hashed_columns_.append(col)
+            elif self.method == "onehot":
+                self.onehot_columns_.append(col)
+            else:
+                self.encoded_columns_.append(col)
+
+    def _fit_blocks(self, X, y):
+        if self.method not in METHODS:
+            raise ValueError(f"Encodage non reconnu : {self.method}")
+        self.feature_names_in_ = np.array(X.columns, dtype=object)
+        self._split_columns(X)
+        # Modalités triées, comme `pd.get_dummies`.
+        self.categories_ = {
+            col: X[col].cat.categories.tolist() if isinstance(X[col].dtype, pd.CategoricalDtype)
+            else sorted(X[col].dropna().unique().tolist())
+            for col in self.onehot_columns_
+        }
+        self.frequencies_ = {}
+        self.target_encoder_ = None
+        if self.method == "frequency":
+            self.frequencies_ = {col: X[col].value_counts(normalize=True).to_dict() for col in self.encoded_columns_}
+
+    def fit(self, X, y=None):
+        self._fit_blocks(X, y)
+        if self.method == "target" and self.encoded_columns_:
+            self._target_encoder(y).fit(self._as_strings(X[self.encoded_columns_]), y)
+        return self
+
+    def fit_transform(self, X, y=None, **fit_params):
+        # Encodage cible croisé (TargetEncoder) : la ligne d'entraînement n'est
+        # jamais encodée avec sa propre cible.
+        self._fit_blocks(X, y)
+        target_block = None
+        if self.method == "target" and self.encoded_columns_:
+            target_block = self._target_encoder(y).fit_transform(self._as_strings(X[self.encoded_columns_]), y)
+        return self._transform(X, target_block)
+
+    def _target_encoder(self, y):
+        if y is None:
+            raise ValueError("L'encodage par la cible nécessite la variable cible.")
+        from sklearn.model_selection import KFold, StratifiedKFold
+        from sklearn.preprocessing import TargetEncoder
+        from sklearn.utils.multiclass import type_of_target
+
+        splitter = KFold if type_of_target(y) == "continuous" else StratifiedKFold
+        self.target_encoder_ = TargetEncoder(cv=splitter(5, shuffle=True, random_state=self.random_state))
+        return self.target_encoder_
+
+    def _as_strings(self, X):
+        return X.astype("object").where(X.notna(), "__nan__").astype(str).to_numpy()
+
+    def _onehot_block(self, X):
+        rows, cols = [], []
+        offset = 0
+        for col in self.onehot_columns_:
+            levels = self.categories_[col]
+            codes = pd.Categorical(X[col], categories=levels).codes
+            known = np.flatnonzero(codes >= 0)
+            rows.append(known)
+            cols.append(offset + codes[known])
+            offset += len(levels)
+        return self._indicator(len(X), rows, cols, offset)
+
+    def _hashed_block(self, X):
+        # Chaque modalité distincte du bloc n'est hachée qu'une fois.
+        rows, cols = [], []
+        for col in self.hashed_columns_:
+            codes, uniques = pd.factorize(X[col])
+            buckets = np.array(
+                [murmurhash3_32(f"{col}={value}", positive=True) % self.n_hash_features for value in uniques],
+                dtype=np.int64
+            )
+            known = np.flatnonzero(codes >= 0)
+            rows.append(known)
+            cols.append(buckets[codes[known]])
+        return self._indicator(len(X), rows, cols, self.n_hash_features if self.hashed_columns_ else 0)
+
+    def _indicator(self, n_rows, rows, cols, n_cols):
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+        data = np.ones(len(rows))
+        # Les collisions de hachage s'additionnent lors de la conversion en CSR.
+        return sparse.coo_matrix((data, (rows, cols)), shape=(n_rows, n_cols)).tocsr()
+
+    def _transform(self, X, target_block=None):
+        blocks = []
+        if self.numeric_columns_:
+            numeric = np.column_stack([
+                pd.to_numeric(X[col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+                for col in self.numeric_columns_
+            ])
+            blocks.append(sparse.csr_matrix(numeric))
+        if self.onehot_columns_:
+            blocks.append(self._onehot_block(X))
+        if self.hashed_columns_:
+            blocks.append(self._hashed_block(X))
+        if self.encoded_columns_:
+            if self.method == "frequency":
+                values = np.column_stack([
+                    X[col].map(self.frequencies_[col]).astype("float64").fillna(0.0).to_numpy()
+                    for col in self.encoded_columns_
+                ])
+            elif target_block is not None:
+                values = target_block
+            else:
+                values = self.target_encoder_.transform(self._as_strings(X[self.encoded_columns_]))
+            blocks.append(sparse.csr_matrix(values))
+        if not blocks:
+            return sparse.csr_matrix((len(X), 0))
+        return sparse.hstack(blocks, format="csr")
+
+    def transform(self, X):
+        missing = [col for col in self.feature_names_in_ if col not in X.columns]
+        if missing:
+            raise ValueError(f"Colonnes manquantes : {', '.join(missing)}")
+        return self._transform(X)
+
+    def get_feature_names_out(self, input_features=None):
+        names = list(self.numeric_columns_)
+        for col in self.onehot_columns_:
+            names += [f"{col}_{level}" for level in self.categories_[col]]
+        if self.hashed_columns_:
+            names += [f"hash_{i}" for i in range(self.n_hash_features)]
+        if self.method == "target" and self.encoded_columns_:
+            names += list(self.target_encoder_.get_feature_names_out(self.encoded_columns_))
+        elif self.encoded_columns_:
+            names += [f"{col}_frequence" for col in self.encoded_columns_]
+        return np.array(names, dtype=object)
@@ -1,11 +1,46 @@
+import csv
+import io
+import re
+import numpy as np
 import pandas as pd
-import tempfile
+from collections import Counter
 from pathlib import Path
 
+from src.classes.dataset_cache import get_dataset_cache
+from src.classes.profiler import Profiler, profile_frame, store_profile
+from src.classes.upload_store import UploadStore, get_upload_store
+from src.functions.instrumentation import measure, shape_of
+
+CHUNKSIZE = 100_000
+BLOCK_SIZE = 1024 * 1024
+SAMPLE_ROWS = 10_000
+MAX_CATEGORIES = 50
+NUMERIC_RATIO = 0.9
+SNIFF_BYTES = 64 * 1024
+DELIMITERS = [",", ";", "\t", "|", " "]
+ENCODINGS = ["utf-8", "cp1252", "latin-1"]
+DOT_DECIMAL = re.compile(r"^[+-]?\d*\.\d+([eE][+-]?\d+)?$")
+COMMA_DECIMAL = re.compile(r"^[+-]?\d*,\d+([eE][+-]?\d+)?$")
+NUMBER = re.compile(r"^[+-]?(\d+([.,]\d*)?|[.,]\d+)([eE][+-]?\d+)?$")
+
+def _downcast_float(values):
+    # float32 seulement si toutes les valeurs s'y relisent à l'identique :
+    # un identifiant 911320502 avec une case vide, ou 123456789.123, reste en float64.
+    narrow = values.astype("float32")
+    if np.array_equal(narrow.to_numpy(dtype="float64"), values.to_numpy(dtype="float64"), equal_nan=True):
+        return narrow
+    return values.astype("float64")
+
 class File:
-    def __init__(self, source, delimiter=','):
+    def __init__(self, source, delimiter=None, chunksize=CHUNKSIZE, memory_limit=None, use_cache=True):
         self.delimiter = delimiter
+        self.dialect = None
         self.temp_path = None
+        self.chunksize = chunksize
+        self.memory_limit = memory_limit
+        self.use_cache = use_cache
+        self.cache_key = None
+        self.kinds = None
 
         if hasattr(source, "read") and hasattr(source, "name"):
             self.uploaded_file = source
@@ -17,28 +52,219 @@ class File:
             self.temp_path = str(source)
             self.is_uploaded_file = False
 
-    def save_temporarily(self):
+    def save_temporarily(self, directory=None):
+        # Copie par blocs dans le stockage des envois, rangée par empreinte du
+        # contenu : un fichier déjà reçu n'est pas stocké une seconde fois.
         if self.is_uploaded_file:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".csv", dir="./uploads/") as tmp:
-                tmp.write(self.uploaded_file.read())
-                self.temp_path = tmp.name
+            store = get_upload_store() if directory is None else UploadStore(directory)
+            if hasattr(self.uploaded_file, "seek"):
+                self.uploaded_file.seek(0)
+            self.temp_path = store.put(self.uploaded_file)
 
-    def get_stats(self):
-        if self.is_uploaded_file:
+    def _decode_head(self):
+        with open(self.temp_path, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+        if len(head) == SNIFF_BYTES and b"\n" in head:
+            # La dernière ligne lue est probablement tronquée.
+            head = head[:head.rindex(b"\n")]
+        if head.startswith(b"\xef\xbb\xbf"):
+            return head.decode("utf-8-sig"), "utf-8-sig"
+        for encoding in ENCODINGS:
+            try:
+                return head.decode(encoding), encoding
+            except UnicodeDecodeError:
+                continue
+
+    def _split(self, text, delimiter, quotechar):
+        reader = csv.reader(io.StringIO(text), delimiter=delimiter, quotechar=quotechar)
+        return [row for row in reader if row]
+
+    def sniff(self):
+        # Détecte le format à partir des premiers Ko seulement, pour ne jamais
+        # lancer une lecture complète avec de mauvais paramètres.
+        if self.is_uploaded_file and self.temp_path is None:
             self.save_temporarily()
 
-        df = pd.read_csv(self.temp_path, delimiter=self.delimiter)
+        text, encoding = self._decode_head()
+        quotechar = "'" if text.count("'") > text.count('"') and re.search(r"(^|[,;\t| ])'", text, re.M) else '"'
+
+        delimiter = self.delimiter
+        if delimiter is None:
+            best_score = None
+            for position, candidate in enumerate(DELIMITERS):
+                counts = [len(row) for row in self._split(text, candidate, quotechar)]
+                if not counts:
+                    continue
+                width, frequency = Counter(counts).most_common(1)[0]
+                if width < 2:
+                    continue
+                score = (frequency / len(counts), -position)
+                if best_score is None or score > best_score:
+                    best_score = score
+                    delimiter = candidate
+            if delimiter is None:
+                delimiter = ","
+
+        rows = self._split(text, delimiter, quotechar)
+        fields = [field.strip() for row in rows[1:] for field in row]
+        decimal = "."
+        if delimiter != ",":
+            commas = sum(1 for field in fields if COMMA_DECIMAL.match(field))
+            dots = sum(1 for field in fields if DOT_DECIMAL.match(field))
+            if commas > dots:
+                decimal = ","
+
+        first_row = rows[0] if rows else []
+        header = not any(NUMBER.match(field.strip()) for field in first_row)
+
+        self.delimiter = delimiter
+        self.dialect = {
+            "delimiter": delimiter,
+            "quotechar": quotechar,
+            "decimal": decimal,
+            "encoding": encoding,
+            "header": header,
+            "n_columns": len(first_row)
+        }
+        return self.dialect
+
+    def read_options(self):
+        if self.dialect is None:
+            self.sniff()
+        options = {
+            "delimiter": self.dialect["delimiter"],
+            "quotechar": self.dialect["quotechar"],
+            "decimal": self.dialect["decimal"],
+            "encoding": self.dialect["encoding"]
+        }
+        if not self.dialect["header"]:
+            options["header"] = None
+            options["names"] = [f"colonne_{i + 1}" for i in range(self.dialect["n_columns"])]
+        return options
 
-        for col in df.columns:
-            if df[col].dtype == object:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+    def infer_dtypes(self):
+        # Un échantillon suffit à décider du type de chaque colonne : numérique
+        # (réduit ensuite en int8..int32, ou en float32 quand c'est sans perte),
+        # catégorielle ou texte libre.
+        sample = pd.read_csv(self.temp_path, nrows=SAMPLE_ROWS, **self.read_options())
+        self.kinds = {}
+        for col in sample.columns:
+            values = sample[col]
+            present = values.notna().sum()
+            if pd.api.types.is_bool_dtype(values):
+                self.kinds[col] = "bool"
+            elif pd.api.types.is_numeric_dtype(values) or present == 0:
+                self.kinds[col] = "numeric"
+            elif pd.to_numeric(values, errors="coerce").notna().sum() >= NUMERIC_RATIO * present:
+                self.kinds[col] = "numeric"
+            elif values.nunique() <= MAX_CATEGORIES:
+                self.kinds[col] = "category"
+            else:
+                self.kinds[col] = "text"
+        return self.kinds
 
-        stats = {
+    def _convert(self, chunk):
+        for col, kind in self.kinds.items():
+            if kind == "numeric":
+                values = pd.to_numeric(chunk[col], errors="coerce")
+                if values.notna().all() and (values % 1 == 0).all():
+                    chunk[col] = pd.to_numeric(values, downcast="integer")
+                else:
+                    chunk[col] = _downcast_float(values)
+            elif kind == "category":
+                chunk[col] = chunk[col].astype("category")
+        return chunk
+
+    def iter_chunks(self):
+        if self.is_uploaded_file and self.temp_path is None:
+            self.save_temporarily()
+        if self.kinds is None:
+            self.infer_dtypes()
+
+        text_columns = {col: str for col, kind in self.kinds.items() if kind in ("category", "text")}
+        reader = pd.read_csv(
+            self.temp_path,
+            chunksize=self.chunksize,
+            dtype=text_columns,
+            **self.read_options()
+        )
+        with reader:
+            for chunk in reader:
+                yield self._convert(chunk)
+
+    def _concat(self, parts):
+        # Assemblage colonne par colonne : chaque morceau est libéré dès que sa
+        # colonne est construite, le pic mémoire reste proche du DataFrame final.
+        columns = {}
+        for col in list(parts):
+            pieces = parts.pop(col)
+            if not pieces:
+                columns[col] = pd.Series(dtype="float32")
+            elif self.kinds.get(col) == "category":
+                columns[col] = pd.Series(pd.api.types.union_categoricals(pieces, ignore_order=True))
+            else:
+                values = pd.concat(pieces, ignore_index=True)
+                # Un bloc entier et un bloc avec des NaN se combinent en float64 :
+                # le float32 n'est repris que si l'ensemble reste sans perte.
+                if self.kinds.get(col) == "numeric" and values.dtype == "float64":
+                    values = _downcast_float(values)
+                columns[col] = values
+            del pieces
+        return pd.DataFrame(columns, copy=False)
+
+    def _build_stats(self, df, profile):
+        return {
             "filename": self.filename,
             "shape": {"rows": df.shape[0], "columns": df.shape[1]},
             "columns": list(df.columns),
             "dtypes": dict(df.dtypes.astype(str)),
-            "missing_values": dict(df.isnull().sum()),
+            "missing_values": {col: int(n) for col, n in profile["manquantes"].items()},
+            "profile": profile,
             "df": df
         }
-        return stats
\ No newline at end of file
+
+    def get_stats(self):
+        with measure("lecture du fichier") as record:
+            stats = self._load_stats()
+            record.update(shape_of(stats["df"]))
+        return stats
+
+    def _load_stats(self):
+        if self.is_uploaded_file and self.temp_path is None:
+            self.save_temporarily()
+
+        cache = get_dataset_cache() if self.use_cache else None
+        if cache is not None:
+            self.cache_key = cache.key(self.temp_path, self.read_options())
+            df = cache.get(self.cache_key)
+            if df is not None:
+                return self._build_stats(df, profile_frame(df, self.cache_key))
+
+        # Le profil est calculé pendant la lecture, sur les mêmes blocs.
+        profiler = Profiler()
+        parts = None
+        used = 0
+
+        for chunk in self.iter_chunks():
+            if parts is None:
+                parts = {col: [] for col in chunk.columns}
+            used += int(chunk.memory_usage(deep=True).sum())
+            if self.memory_limit is not None and used > self.memory_limit:
+                raise MemoryError(
+                    f"Le fichier dépasse la limite mémoire configurée ({self.memory_limit} octets)."
+                )
+            profiler.update(chunk)
+            for col in chunk.columns:
+                parts[col].append(chunk[col].reset_index(drop=True))
+            del chunk
+
+        df = self._concat(parts if parts is not None else {col: [] for col in self.kinds})
+        if profiler.columns is None:
+            profiler.update(df)
+        profile = profiler.report(df.dtypes)
+
+        if cache is not None:
+            cache.put(self.cache_key, df)
+            store_profile(self.cache_key, profile)
+            df = df.copy(deep=False)
+        return self._build_stats(df, profile)
@@ -0,0 +1,222 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+import uuid
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from contextlib import contextmanager
+
+from src.classes.model_registry import get_model_registry
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+# Durée pendant laquelle l'état d'une tâche terminée reste consultable.
+JOB_TTL_SECONDS = 3600
+
+class JobCancelled(Exception):
+    pass
+
+class JobContext:
+    # Transmis à la tâche dans le processus de travail : elle y publie son
+    # avancement et vérifie régulièrement si une annulation a été demandée.
+    def __init__(self, job_id, progress, cancelled, measures):
+        self.job_id = job_id
+        self._progress = progress
+        self._cancelled = cancelled
+        self._measures = measures
+
+    def report(self, progress, message=""):
+        self.check_cancelled()
+        self._progress[self.job_id] = (float(progress), message)
+
+    def check_cancelled(self):
+        if self._cancelled.get(self.job_id):
+            raise JobCancelled()
+
+    def publish_measures(self, records):
+        self._measures[self.job_id] = records
+
+def _run(function, context, args, kwargs):
+    from src.functions.instrumentation import collect
+
+    context.report(0.0, "Démarrage")
+    # Les mesures des étapes exécutées dans le processus de travail sont
+    # renvoyées avec l'état de la tâche.
+    with collect() as records:
+        try:
+            return function(context, *args, **kwargs)
+        finally:
+            context.publish_measures(records)
+
+def clustering_job(context, df, columns, algo, params, key):
+    from src.classes.clustering import Clustering
+
+    context.report(0.1, "Préparation des données")
+    clustering = Clustering(df)
+    clustering.set_features(columns)
+    context.report(0.2, "Clustering en cours")
+    if algo == "K-Means":
+        clustering.run_kmeans(**params)
+    elif algo == "DBSCAN":
+        clustering.run_dbscan(**params)
+    else:
+        clustering.run_hca(**params)
+    # La projection affichée à l'évaluation est calculée ici, une fois pour toutes.
+    context.report(0.8, "Projection 2D")
+    clustering.get_projection("pca")
+    context.report(0.9, "Enregistrement du modèle")
+    return get_model_registry().put(key, clustering)
+
+def prediction_job(context, df, features, target, task_type, algo, params, key, encoding="onehot", tune=False):
+    from src.classes.prediction import fit_prediction
+
+    fit_prediction(df, features, target, task_type, algo, params, key, encoding=encoding, tune=tune, report=context.report)
+    return key
+
+_main_lock = threading.Lock()
+
+@contextmanager
+def _neutral_main():
+    # Streamlit exécute chaque page sous le nom `__main__` : un processus lancé
+    # en "forkserver" ou "spawn" ré-exécuterait la page à son démarrage. Le
+    # module principal est masqué le temps du lancement.
+    with _main_lock:
+        main = sys.modules.get("__main__")
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main
+
+class Job:
+    def __init__(self, job_id, key=None):
+        self.id = job_id
+        self.key = key
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.future = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+class JobQueue:
+    # File de tâches locale : les entraînements tournent dans des processus
+    # séparés, jamais dans le fil d'exécution de la page ou de la requête.
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 1) - 1)
+        # Pas de "fork" : le serveur est multi-threadé et OpenMP n'y survit pas.
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self.context = multiprocessing.get_context(method)
+        with _neutral_main():
+            self.manager = self.context.Manager()
+        self.progress = self.manager.dict()
+        self.cancelled = self.manager.dict()
+        self.measures = self.manager.dict()
+        self.pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self.context)
+        self.jobs = {}
+        # Réentrant : annuler une tâche en attente appelle aussitôt `_finish`.
+        self.lock = threading.RLock()
+
+    def _prune(self):
+        # Les tâches terminées depuis plus de JOB_TTL_SECONDS sont oubliées,
+        # avec leur avancement et leurs mesures conservés par le Manager.
+        limit = time.time() - JOB_TTL_SECONDS
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED and job.finished_at < limit]
+            for job_id in expired:
+                del self.jobs[job_id]
+        for job_id in expired:
+            self.progress.pop(job_id, None)
+            self.measures.pop(job_id, None)
+            self.cancelled.pop(job_id, None)
+
+    def submit(self, function, *args, key=None, **kwargs):
+        # Une tâche identique (même clé) en attente ou en cours est réutilisée ;
+        # un modèle déjà enregistré donne directement une tâche terminée.
+        self._prune()
+        with self.lock:
+            if key is not None:
+                for job in self.jobs.values():
+                    if job.key == key and job.status in (PENDING, RUNNING, DONE):
+                        return job.id
+            job = Job(uuid.uuid4().hex, key)
+            self.jobs[job.id] = job
+            if key is not None and key in get_model_registry():
+                job.status, job.result, job.finished_at = DONE, key, time.time()
+                return job.id
+            context = JobContext(job.id, self.progress, self.cancelled, self.measures)
+            with _neutral_main():
+                # Les processus de travail sont lancés à la demande, lors de la soumission.
+                job.future = self.pool.submit(_run, function, context, args, kwargs)
+        job.future.add_done_callback(lambda future: self._finish(job, future))
+        return job.id
+
+    def _finish(self, job, future):
+        with self.lock:
+            try:
+                job.result = future.result()
+                job.status = DONE
+            except (CancelledError, JobCancelled):
+                job.status = CANCELLED
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e) or type(e).__name__
+            job.finished_at = time.time()
+        self.cancelled.pop(job.id, None)
+
+    def _get(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Tâche inconnue : {job_id}")
+        return job
+
+    def status(self, job_id):
+        self._prune()
+        with self.lock:
+            job = self._get(job_id)
+            status = job.status
+        progress, message = self.progress.get(job_id, (0.0, ""))
+        if status == PENDING and job_id in self.progress:
+            status = RUNNING
+        if status == DONE:
+            progress, message = 1.0, "Terminé"
+        return {
+            "id": job.id,
+            "status": status,
+            "progress": progress,
+            "message": message,
+            "result": job.result,
+            "error": job.error,
+            "measures": list(self.measures.get(job_id, []))
+        }
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self._get(job_id)
+            if job.status in FINISHED:
+                return False
+            if job.future is not None and job.future.cancel():
+                return True
+            # Déjà démarrée : la tâche s'arrêtera à son prochain point de contrôle.
+            self.cancelled[job_id] = True
+            return True
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.manager.shutdown()
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
@@ -0,0 +1,324 @@
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BATCH_SIZE = 2048
+BRUTE_FORCE_ROWS = 64
+BLOCK_ELEMENTS = 4_000_000
+RECALL_SAMPLE = 200
+# Mode approximatif : le nombre de cellules parcourues est doublé jusqu'à ce
+# rappel, mesuré sur le même échantillon que `estimate_recall`.
+TARGET_RECALL = 0.95
+
+class FastKNNImputer:
+    # Imputation KNN avec les règles de KNNImputer : pour une colonne, toute
+    # ligne où elle est renseignée est donneuse, à la distance nan_euclidean
+    # (coordonnées renseignées des deux côtés, pondérées par
+    # n_colonnes / n_communes). Seules les lignes incomplètes sont
+    # interrogées, par lots et par motif de valeurs manquantes, sur plusieurs threads.
+    #   mode="exact"       : arbre KD/Ball (NearestNeighbors) par motif sur les
+    #                        lignes complètes, recherche exhaustive par blocs
+    #                        sur les lignes incomplètes
+    #   mode="approximate" : index IVF (k-means sur toutes les lignes), seules
+    #                        les `n_probe` cellules les plus proches de chaque
+    #                        requête sont parcourues ; sans `n_probe`, leur
+    #                        nombre est calibré pour atteindre TARGET_RECALL.
+    #                        S'il faut parcourir plus de la moitié des
+    #                        cellules, la recherche exacte est utilisée.
+    # Dans les deux modes, un motif de moins de BRUTE_FORCE_ROWS lignes est
+    # cherché exhaustivement : un index ne s'y amortit pas.
+    def __init__(self, n_neighbors=3, mode="exact", batch_size=BATCH_SIZE, n_jobs=None,
+                 n_lists=None, n_probe=None, random_state=0):
+        if mode not in ("exact", "approximate"):
+            raise ValueError("Mode KNN non reconnu : exact ou approximate.")
+        self.n_neighbors = n_neighbors
+        self.mode = mode
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.random_state = random_state
+        self.fit_X = None
+
+    def fit(self, X):
+        X = np.asarray(X, dtype="float64")
+        self.fit_X = X
+        self.present = ~np.isnan(X)
+        self.n_features = X.shape[1]
+        self.k = self.n_neighbors
+        counts = self.present.sum(axis=0)
+        # Moyenne des valeurs renseignées : repli sans donneur, comme KNNImputer.
+        self.means = np.where(
+            counts > 0, np.where(self.present, X, 0.0).sum(axis=0) / np.maximum(counts, 1), np.nan
+        )
+        # Une ligne sans aucune valeur n'est à distance définie d'aucune autre.
+        complete = self.present.all(axis=1)
+        donors = self.present.any(axis=1)
+        self.complete = np.flatnonzero(complete)
+        self.partial = np.flatnonzero(donors & ~complete)
+        self.donors = np.flatnonzero(donors)
+        self.search = "exact"
+
+        if self.mode == "approximate" and len(self.donors):
+            from sklearn.cluster import MiniBatchKMeans
+            n_lists = self.n_lists or int(np.clip(np.sqrt(len(self.donors)), 1, 4096))
+            n_lists = min(n_lists, len(self.donors))
+            # Cellules apprises sur les lignes complétées par les moyennes, puis
+            # chaque ligne rangée selon sa distance nan_euclidean aux centres.
+            filled = np.where(self.present[self.donors], X[self.donors], np.nan_to_num(self.means))
+            kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=self.random_state, n_init=3, batch_size=4096)
+            self.centroids = kmeans.fit(filled).cluster_centers_
+            labels = np.empty(len(self.donors), dtype=np.int64)
+            everything = np.ones(self.n_features, dtype=bool)
+            step = max(1, BLOCK_ELEMENTS // n_lists)
+            for start in range(0, len(self.donors), step):
+                rows = self.donors[start:start + step]
+                labels[start:start + step] = self._distances(self.centroids, everything, rows).argmin(axis=0)
+            order = np.argsort(labels, kind="stable")
+            bounds = np.searchsorted(labels[order], np.arange(n_lists + 1))
+            self.members = [self.donors[order[bounds[c]:bounds[c + 1]]] for c in range(n_lists)]
+            self._calibrate(X)
+        return self
+
+    def _calibrate(self, X):
+        # Cellules parcourues : `n_probe` s'il est fixé, sinon doublées à partir
+        # de 8 jusqu'à TARGET_RECALL ou jusqu'à parcourir toutes les cellules.
+        n_lists = len(self.centroids)
+        self.search = "ivf"
+        if self.n_probe is not None:
+            self.cells_probed = min(self.n_probe, n_lists)
+            return
+        self.cells_probed = min(8, n_lists)
+        while 2 * self.cells_probed <= n_lists:
+            if self.estimate_recall(X) >= TARGET_RECALL:
+                return
+            self.cells_probed *= 2
+        # L'index n'apporte plus rien face à la recherche exacte.
+        self.search = "exact"
+
+    def _squared_distances(self, a, b):
+        return np.maximum(
+            (a ** 2).sum(axis=1)[:, None] - 2 * a @ b.T + (b ** 2).sum(axis=1)[None, :],
+            0
+        )
+
+    def _distances(self, queries, observed, rows):
+        # Carré de la distance nan_euclidean entre des requêtes renseignées sur
+        # `observed` et des lignes de référence : seules les coordonnées
+        # communes comptent ; inf sans aucune coordonnée commune.
+        present = self.present[rows][:, observed]
+        values = np.where(present, self.fit_X[rows][:, observed], 0.0)
+        squared = (queries ** 2) @ present.T - 2 * queries @ values.T + (values ** 2).sum(axis=1)[None, :]
+        shared = present.sum(axis=1)
+        weight = self.n_features / np.maximum(shared, 1)
+        return np.where(shared > 0, np.maximum(squared, 0) * weight, np.inf)
+
+    def _blocks(self, queries, observed, rows):
+        # Distances aux lignes `rows` par blocs, pour borner la mémoire.
+        block = max(self.k, BLOCK_ELEMENTS // max(len(queries), 1))
+        for start in range(0, len(rows), block):
+            ids = rows[start:start + block]
+            yield ids, self._distances(queries, observed, ids)
+
+    def _nearest(self, sources, n_queries, missing_columns, best=None):
+        # Les k donneurs les plus proches de chaque requête, pour chaque colonne
+        # manquante : seules les lignes où la colonne est renseignée comptent.
+        # Une distance inf marque une place sans donneur. `best` : voisins déjà
+        # trouvés, complétés par ces sources.
+        if best is None:
+            best = {
+                c: (np.empty((n_queries, 0), dtype=np.int64), np.empty((n_queries, 0)))
+                for c in missing_columns
+            }
+        for ids, squared in sources:
+            valid = self.present[ids, :]
+            ids = np.broadcast_to(ids, squared.shape)
+            for c in missing_columns:
+                index = np.hstack([best[c][0], ids])
+                distance = np.hstack([best[c][1], np.where(valid[..., c], squared, np.inf)])
+                if distance.shape[1] > self.k:
+                    keep = np.argpartition(distance, self.k - 1, axis=1)[:, :self.k]
+                    index = np.take_along_axis(index, keep, axis=1)
+                    distance = np.take_along_axis(distance, keep, axis=1)
+                best[c] = (index, distance)
+        for c, (index, distance) in best.items():
+            if distance.shape[1] < self.k:
+                padding = self.k - distance.shape[1]
+                best[c] = (
+                    np.pad(index, ((0, 0), (0, padding))),
+                    np.pad(distance, ((0, 0), (0, padding)), constant_values=np.inf)
+                )
+        return best
+
+    def _build_index(self, observed):
+        if self.search == "ivf":
+            return self.centroids[:, observed]
+        from sklearn.neighbors import NearestNeighbors
+        return NearestNeighbors(n_neighbors=min(self.k, len(self.complete))).fit(self.fit_X[self.complete][:, observed])
+
+    def _exact_sources(self, index, queries, observed):
+        if index is None:
+            yield from self._blocks(queries, observed, self.donors)
+            return
+        # Lignes complètes : distance euclidienne sur le motif, à la même
+        # pondération que nan_euclidean ; les lignes incomplètes sont parcourues.
+        distance, ids = index.kneighbors(queries)
+        yield self.complete[ids], distance ** 2 * (self.n_features / observed.sum())
+        yield from self._blocks(queries, observed, self.partial)
+
+    def _search(self, index, queries, observed, missing_columns):
+        if index is None or self.search == "exact":
+            return self._nearest(self._exact_sources(index, queries, observed), len(queries), missing_columns)
+
+        # Cellules de chaque requête, à la distance nan_euclidean : les centres
+        # sont complets, c'est donc l'euclidienne sur les colonnes renseignées.
+        n_queries = len(queries)
+        distances = self._squared_distances(queries, index)
+        probes = np.argpartition(distances, self.cells_probed - 1, axis=1)[:, :self.cells_probed]
+        nearest = {
+            c: (np.zeros((n_queries, self.k), dtype=np.int64), np.full((n_queries, self.k), np.inf))
+            for c in missing_columns
+        }
+        # Parcours cellule par cellule, chacune avec les requêtes qui la sondent.
+        order = np.argsort(probes, axis=None, kind="stable")
+        cells = probes.ravel()[order]
+        bounds = np.flatnonzero(np.diff(cells)) + 1
+        for positions in np.split(order, bounds):
+            members = self.members[probes.flat[positions[0]]]
+            if len(members) == 0:
+                continue
+            group = positions // self.cells_probed
+            best = {c: (nearest[c][0][group], nearest[c][1][group]) for c in missing_columns}
+            found = self._nearest(self._blocks(queries[group], observed, members), len(group), missing_columns, best)
+            for c in missing_columns:
+                nearest[c][0][group], nearest[c][1][group] = found[c]
+        # Sans aucun donneur dans les cellules parcourues pour une colonne, la
+        # requête est reprise sur toutes les lignes plutôt que de retomber sur la moyenne.
+        lost = np.zeros(n_queries, dtype=bool)
+        for c in missing_columns:
+            lost |= ~np.isfinite(nearest[c][1]).any(axis=1)
+        if lost.any() and self.cells_probed < len(self.centroids):
+            retry = self._nearest(self._blocks(queries[lost], observed, self.donors), lost.sum(), missing_columns)
+            for c in missing_columns:
+                nearest[c][0][lost], nearest[c][1][lost] = retry[c]
+        return nearest
+
+    def _batches(self, missing, pattern_sizes=None):
+        rows = np.flatnonzero(missing.any(axis=1))
+        if len(rows) == 0:
+            return []
+        patterns, inverse = np.unique(missing[rows], axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        batches = []
+        for p, pattern in enumerate(patterns):
+            pattern_rows = rows[inverse == p]
+            size = len(pattern_rows) if pattern_sizes is None else pattern_sizes[pattern_rows[0]]
+            for start in range(0, len(pattern_rows), self.batch_size):
+                batches.append((pattern_rows[start:start + self.batch_size], ~pattern, size))
+        return batches
+
+    def kneighbors(self, X, pattern_sizes=None):
+        # Pour chaque lot de lignes incomplètes : {colonne manquante: (indices
+        # dans les lignes d'apprentissage, carrés des distances)}, ou None si
+        # aucune distance n'est définie. L'index d'un motif est construit par
+        # le premier lot qui en a besoin et libéré après son dernier lot.
+        # `pattern_sizes` : taille du motif de chaque ligne dans le jeu complet,
+        # pour qu'un échantillon soit traité comme le serait ce jeu.
+        X = np.asarray(X, dtype="float64")
+        batches = self._batches(np.isnan(X), pattern_sizes)
+        pending = Counter(observed.tobytes() for _, observed, _ in batches)
+        indexes = {}
+        locks = {}
+        guard = threading.Lock()
+
+        def run(batch):
+            rows, observed, pattern_size = batch
+            if not observed.any() or len(self.donors) == 0:
+                return rows, None
+            queries = X[rows][:, observed]
+            missing_columns = np.flatnonzero(~observed)
+            key = observed.tobytes()
+            if pattern_size < BRUTE_FORCE_ROWS or (self.search == "exact" and len(self.complete) < self.k):
+                index = None
+            else:
+                with guard:
+                    lock = locks.setdefault(key, threading.Lock())
+                with lock:
+                    if key not in indexes:
+                        indexes[key] = self._build_index(observed)
+                    index = indexes[key]
+            nearest = self._search(index, queries, observed, missing_columns)
+            with guard:
+                pending[key] -= 1
+                if pending[key] == 0:
+                    indexes.pop(key, None)
+                    locks.pop(key, None)
+            return rows, nearest
+
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as pool:
+            return list(pool.map(run, batches))
+
+    def transform(self, X):
+        X = np.array(X, dtype="float64", copy=True)
+        missing = np.isnan(X)
+        for rows, nearest in self.kneighbors(X):
+            for c in np.flatnonzero(missing[rows[0]]):
+                if nearest is None:
+                    X[rows, c] = self.means[c]
+                    continue
+                # Moyenne des donneurs trouvés (parfois moins de k) ; la moyenne
+                # de la colonne s'il n'y en a aucun.
+                index, distance = nearest[c]
+                found = np.isfinite(distance)
+                count = found.sum(axis=1)
+                total = np.where(found, self.fit_X[index, c], 0.0).sum(axis=1)
+                X[rows, c] = np.where(count > 0, total / np.maximum(count, 1), self.means[c])
+        return X
+
+    def fit_transform(self, X):
+        return self.fit(X).transform(X)
+
+    def estimate_recall(self, X, sample_size=RECALL_SAMPLE):
+        # Part des voisins de KNNImputer retrouvés, sur un échantillon de
+        # lignes incomplètes. La référence suit KNNImputer : distances
+        # nan_euclidean de scikit-learn vers toutes les lignes d'apprentissage,
+        # donneurs propres à chaque colonne manquante. Un voisin à égalité de
+        # distance avec le k-ième de la référence compte comme retrouvé.
+        from sklearn.metrics.pairwise import nan_euclidean_distances
+
+        X = np.asarray(X, dtype="float64")
+        missing = np.isnan(X)
+        rows = np.flatnonzero(missing.any(axis=1) & ~missing.all(axis=1))
+        if len(rows) == 0:
+            return 1.0
+        _, inverse, counts = np.unique(missing, axis=0, return_inverse=True, return_counts=True)
+        rng = np.random.default_rng(self.random_state)
+        chosen = rng.choice(rows, size=min(sample_size, len(rows)), replace=False)
+        sample = X[chosen]
+        sample_sizes = counts[inverse.ravel()[chosen]]
+
+        hits = expected = 0
+        step = max(1, BLOCK_ELEMENTS // len(self.fit_X))
+        kth = min(self.k, len(self.fit_X)) - 1
+        for batch_rows, nearest in self.kneighbors(sample, sample_sizes):
+            if nearest is None:
+                continue
+            for start in range(0, len(batch_rows), step):
+                batch = batch_rows[start:start + step]
+                reference = nan_euclidean_distances(sample[batch], self.fit_X)
+                for c, (index, distance) in nearest.items():
+                    donors = np.where(self.present[:, c], reference, np.nan)
+                    n_expected = np.minimum(self.k, (~np.isnan(donors)).sum(axis=1))
+                    # Les nan (pas de donneur) sont rangés en dernier.
+                    closest = np.sort(np.partition(donors, kth, axis=1)[:, :kth + 1], axis=1)
+                    threshold = closest[np.arange(len(batch)), np.maximum(n_expected - 1, 0)]
+                    index, distance = index[start:start + step], distance[start:start + step]
+                    retrieved = np.isfinite(distance) & (
+                        np.take_along_axis(reference, index, axis=1) <= (threshold * (1 + 1e-9) + 1e-12)[:, None]
+                    )
+                    hits += np.minimum(n_expected, retrieved.sum(axis=1)).sum()
+                    expected += n_expected.sum()
+        return float(hits / expected) if expected else 1.0
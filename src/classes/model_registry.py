@@ -0,0 +1,78 @@
+import logging
+import os
+import threading
+from pathlib import Path
+
+import joblib
+
+from src.functions.fingerprint import params_fingerprint
+
+MODELS_DIR = "./cache/models"
+
+class ModelRegistry:
+    # Les modèles entraînés sont stockés sur disque (joblib) et identifiés par
+    # l'empreinte du jeu de données et des hyperparamètres : la session ne
+    # garde que cette clé, et un entraînement identique est servi depuis le cache.
+    def __init__(self, directory=MODELS_DIR):
+        self.directory = Path(directory)
+
+    def key(self, kind, dataset_key, **params):
+        return params_fingerprint(kind, dataset_key, sorted(params.items()))
+
+    def _path(self, key):
+        return self.directory / f"{key}.joblib"
+
+    def __contains__(self, key):
+        return self._path(key).exists()
+
+    def get(self, key, mmap=True):
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            # Les tableaux numpy sont projetés en mémoire, en lecture seule ;
+            # un modèle à mettre à jour doit être chargé avec mmap=False.
+            return joblib.load(path, mmap_mode="r" if mmap else None)
+        except Exception as e:
+            logging.error(f"Modèle illisible {path} : {e}")
+            return None
+
+    def _write(self, path, write):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def put(self, key, model, lineage=None):
+        # `lineage` identifie une configuration indépendamment des données :
+        # il pointe vers le dernier modèle entraîné avec cette configuration.
+        self._write(self._path(key), lambda tmp_path: joblib.dump(model, tmp_path))
+        if lineage is not None:
+            self._write(self.directory / f"{lineage}.latest", lambda tmp_path: tmp_path.write_text(key))
+        return key
+
+    def latest(self, lineage):
+        path = self.directory / f"{lineage}.latest"
+        if not path.exists():
+            return None
+        key = path.read_text().strip()
+        return key if key in self else None
+
+    def invalidate(self, key):
+        path = self._path(key)
+        if path.exists():
+            path.unlink()
+
+_model_registry = None
+_model_registry_lock = threading.Lock()
+
+def get_model_registry():
+    global _model_registry
+    with _model_registry_lock:
+        if _model_registry is None:
+            _model_registry = ModelRegistry()
+        return _model_registry
@@ -0,0 +1,64 @@
+import sys
+import threading
+
+import pandas as pd
+
+from src.classes.dataset_cache import MemoryLRU, frame_nbytes
+from src.functions.fingerprint import frame_fingerprint, params_fingerprint
+
+STEP_CACHE_BUDGET = 256 * 1024 * 1024
+
+def result_nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return frame_nbytes(value)
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(result_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+_step_cache = MemoryLRU(STEP_CACHE_BUDGET, sizeof=result_nbytes)
+_step_locks = {}
+_step_locks_lock = threading.Lock()
+
+class PipelineStep:
+    # Un nœud du graphe de pré-traitement : son résultat est mémorisé selon
+    # l'empreinte de l'entrée et les paramètres de l'étape, et n'est calculé
+    # qu'à la première lecture de `result`.
+    def __init__(self, key, compute, value=None):
+        self.key = key
+        self._compute = compute
+        self._value = value
+
+    @classmethod
+    def source(cls, df, fingerprint=None):
+        key = fingerprint if fingerprint is not None else frame_fingerprint(df)
+        return cls(key, None, value=df)
+
+    def then(self, name, params, function):
+        key = params_fingerprint(self.key, name, sorted(params.items()))
+        return PipelineStep(key, lambda: function(self.result))
+
+    def is_cached(self):
+        return self._value is not None or self.key in _step_cache
+
+    @property
+    def result(self):
+        if self._value is not None:
+            return self._value
+        value = _step_cache.get(self.key)
+        if value is not None:
+            return value
+        with _step_locks_lock:
+            lock = _step_locks.setdefault(self.key, threading.Lock())
+        with lock:
+            # Deux sessions qui demandent la même étape ne la calculent qu'une fois.
+            value = _step_cache.get(self.key)
+            if value is None:
+                value = self._compute()
+                _step_cache.put(self.key, value)
+        with _step_locks_lock:
+            _step_locks.pop(self.key, None)
+        return value
@@ -1,19 +1,75 @@
-from matplotlib import pyplot as plt
+import importlib
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
-import seaborn
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, confusion_matrix, r2_score, mean_squared_error
 
-from sklearn.linear_model import LogisticRegression, LinearRegression
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.tree import DecisionTreeRegressor
+from src.classes.encoder import MAX_CARDINALITY, CategoricalEncoder
+from src.functions.fingerprint import params_fingerprint, row_hashes, rows_fingerprint
+from src.functions.instrumentation import instrumented
+
+TRAIN_STEPS = 10
+CHUNKSIZE = 100_000
+PIPELINE_CACHE_DIR = "./cache/pipeline"
+PIPELINE_CACHE_BYTES = "512M"
+HALVING_MIN_CANDIDATES = 3
+PARAM_GRIDS = {
+    "Random Forest": {"n_estimators": [50, 100, 200], "max_depth": [None, 10, 20], "min_samples_leaf": [1, 5]},
+    "Logistic Regression": {"C": [0.01, 0.1, 1.0, 10.0]},
+    "Régression Linéaire": {"fit_intercept": [True, False]},
+    "Arbre de régression": {"max_depth": [3, 5, 10, 20, None], "min_samples_leaf": [1, 5, 20]},
+    "SGD (incrémental)": {"sgd__alpha": [1e-5, 1e-4, 1e-3]}
+}
+
+def _factory(path, **defaults):
+    # La classe ("module.Classe") n'est importée qu'à la construction du modèle.
+    def build(**params):
+        module, name = path.rsplit(".", 1)
+        return getattr(importlib.import_module(module), name)(**defaults, **params)
+    return build
+
+def _sgd_factory(path, **defaults):
+    def build(**params):
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import StandardScaler
+
+        # Mise à l'échelle sans centrage : la matrice encodée reste creuse.
+        steps = [("scaler", StandardScaler(with_mean=False)), ("sgd", _factory(path, **defaults)())]
+        return Pipeline(steps).set_params(**params)
+    return build
+
+MODEL_FACTORIES = {
+    "classification": {
+        "Random Forest": _factory("sklearn.ensemble.RandomForestClassifier"),
+        "Logistic Regression": _factory("sklearn.linear_model.LogisticRegression", max_iter=1000),
+        "SGD (incrémental)": _sgd_factory("sklearn.linear_model.SGDClassifier", loss="log_loss", random_state=0)
+    },
+    "régression": {
+        "Régression Linéaire": _factory("sklearn.linear_model.LinearRegression"),
+        "Arbre de régression": _factory("sklearn.tree.DecisionTreeRegressor"),
+        "SGD (incrémental)": _sgd_factory("sklearn.linear_model.SGDRegressor", random_state=0)
+    }
+}
+
+def _is_forest(model):
+    # Sans importer scikit-learn si aucun modèle n'est encore construit.
+    return type(model).__name__ == "RandomForestClassifier"
+
+def _is_sgd_pipeline(model):
+    return type(model).__name__ == "Pipeline" and "sgd" in model.named_steps
 
 
 class Prediction:
-    def __init__(self, df: pd.DataFrame, features: list, target: str, task_type: str):
+    def __init__(self, df: pd.DataFrame, features: list, target: str, task_type: str,
+                 encoding="onehot", max_cardinality=MAX_CARDINALITY):
         self.df = df.dropna(subset=features + [target])
-        self.X = pd.get_dummies(self.df[features])
+        self.features = list(features)
+        self.target = target
+        self.X = self.df[features]
         self.y = self.df[target]
+        self.encoder = CategoricalEncoder(method=encoding, max_cardinality=max_cardinality)
         self.task_type = task_type.lower()
         self.model = None
         self.X_train = None
@@ -21,37 +77,249 @@ class Prediction:
         self.y_train = None
         self.y_test = None
         self.y_pred = None
+        self.raw_train = None
+        self.raw_test = None
+        self.best_params = None
+        self.cv_score = None
+        self.cv_results = None
+        self.n_rows = 0
+        self.rows_fingerprint = None
+        self.incremental_rows = 0
+
+    def __getstate__(self):
+        # Seuls les jeux d'entraînement et de test sont conservés avec le modèle enregistré.
+        state = self.__dict__.copy()
+        state.update(df=None, X=None, y=None, raw_train=None, raw_test=None)
+        return state
+
+    def encode(self, df):
+        # Rejoue l'encodeur appris sur le jeu d'entraînement (matrice creuse).
+        return self.encoder.transform(df)
+
+    def predict_batch(self, source, output_path, chunksize=CHUNKSIZE, n_jobs=None, keep_columns=()):
+        # Prédiction par blocs : chaque bloc est encodé avec la disposition
+        # figée puis prédit dans un pool de threads ; au plus `n_jobs` blocs
+        # sont en mémoire et les résultats sont écrits dans l'ordre au fil de l'eau.
+        from src.classes.file import File
+
+        if isinstance(source, pd.DataFrame):
+            chunks = (source.iloc[start:start + chunksize] for start in range(0, len(source), chunksize))
+        else:
+            if not isinstance(source, File):
+                source = File(source, chunksize=chunksize)
+            chunks = source.iter_chunks()
+        n_jobs = n_jobs or os.cpu_count() or 1
+
+        def predict(chunk):
+            X = self.encode(chunk)
+            # Comme à l'entraînement, les lignes incomplètes ne sont pas prédites.
+            invalid = chunk[self.features].isna().any(axis=1).to_numpy().copy()
+            coo = X.tocoo()
+            invalid[coo.row[np.isnan(coo.data)]] = True
+            valid = ~invalid
+            result = chunk[list(keep_columns)].copy() if keep_columns else pd.DataFrame(index=chunk.index)
+            predictions = pd.Series(pd.NA, index=chunk.index, dtype="object")
+            if valid.any():
+                predictions[valid] = self.model.predict(X[valid])
+            result["prediction"] = predictions
+            return result
+
+        n_rows = 0
+        with open(output_path, "w", newline="", encoding="utf-8") as f, ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            pending = deque()
+            header = True
+
+            def write(result):
+                nonlocal header, n_rows
+                result.to_csv(f, header=header, index=False)
+                header = False
+                n_rows += len(result)
+
+            for chunk in chunks:
+                pending.append(pool.submit(predict, chunk))
+                if len(pending) >= n_jobs:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+            if header:
+                pd.DataFrame(columns=list(keep_columns) + ["prediction"]).to_csv(f, index=False)
+        return n_rows
 
     def split(self, test_size=0.2, random_state=42):
-        self.X_train, self.X_test, self.y_train, self.y_test = train_test_split(
+        from sklearn.model_selection import train_test_split
+
+        self.raw_train, self.raw_test, self.y_train, self.y_test = train_test_split(
             self.X, self.y, test_size=test_size, random_state=random_state
         )
+        # L'encodeur n'apprend que sur le jeu d'entraînement.
+        self.X_train = self.encoder.fit_transform(self.raw_train, self.y_train)
+        self.X_test = self.encoder.transform(self.raw_test)
+        # Empreinte des lignes apprises, pour reconnaître plus tard des données complétées.
+        hashes = row_hashes(self.df[self.features + [self.target]])
+        self.n_rows = len(hashes)
+        self.rows_fingerprint = rows_fingerprint(hashes)
+        self.incremental_rows = 0
 
-    def set_model(self, name: str, **params):
+    def _build_model(self, name, **params):
         if self.task_type == "classification":
-            if name == "Random Forest":
-                self.model = RandomForestClassifier(**params)
-            elif name == "Logistic Regression":
-                self.model = LogisticRegression(max_iter=1000, **params)
-            else:
+            factories = MODEL_FACTORIES["classification"]
+            if name not in factories:
                 raise ValueError("Modèle de classification non reconnu.")
         elif self.task_type in ["régression", "regression"]:
-            if name == "Régression Linéaire":
-                self.model = LinearRegression(**params)
-            elif name == "Arbre de régression":
-                self.model = DecisionTreeRegressor(**params)
-            else:
+            factories = MODEL_FACTORIES["régression"]
+            if name not in factories:
                 raise ValueError("Modèle de régression non reconnu.")
         else:
             raise ValueError("Type de tâche non reconnu : classification ou régression")
+        return factories[name](**params)
+
+    def set_model(self, name: str, **params):
+        self.model = self._build_model(name, **params)
+
+    @instrumented("recherche d'hyperparamètres", data=lambda self, *args, **kwargs: self.X_train)
+    def tune(self, name, param_grid=None, cv=5, search="halving", n_jobs=-1, random_state=42):
+        # Validation croisée sur le jeu d'entraînement. L'encodeur fait partie
+        # du pipeline : il est réappris sur chaque pli, et son résultat est mis
+        # en cache (joblib.Memory) pour être partagé par tous les candidats.
+        from joblib import Memory
+        from sklearn.base import clone
+        from sklearn.model_selection import GridSearchCV, KFold, StratifiedKFold
+        from sklearn.pipeline import Pipeline
+
+        if self.raw_train is None:
+            raise RuntimeError("Les données n'ont pas encore été séparées.")
+        grid = PARAM_GRIDS.get(name, {}) if param_grid is None else param_grid
+        grid = {f"model__{param}": values for param, values in grid.items()}
+        if self.task_type == "classification":
+            folds = StratifiedKFold(cv, shuffle=True, random_state=random_state)
+            scoring = "accuracy"
+        else:
+            folds = KFold(cv, shuffle=True, random_state=random_state)
+            scoring = "r2"
+
+        memory = Memory(PIPELINE_CACHE_DIR, verbose=0)
+        pipeline = Pipeline([("encoder", clone(self.encoder)), ("model", self._build_model(name))], memory=memory)
+        n_candidates = int(np.prod([len(values) for values in grid.values()])) if grid else 1
+        if search == "halving" and n_candidates > HALVING_MIN_CANDIDATES:
+            # Successive halving : tous les candidats commencent sur peu de
+            # lignes, seul le meilleur tiers passe à l'étape suivante.
+            from sklearn.experimental import enable_halving_search_cv  # noqa
+            from sklearn.model_selection import HalvingGridSearchCV
+            searcher = HalvingGridSearchCV(
+                pipeline, grid, cv=folds, scoring=scoring, n_jobs=n_jobs,
+                factor=3, min_resources="exhaust", random_state=random_state
+            )
+        else:
+            searcher = GridSearchCV(pipeline, grid, cv=folds, scoring=scoring, n_jobs=n_jobs)
+        try:
+            searcher.fit(self.raw_train, self.y_train)
+        finally:
+            memory.reduce_size(bytes_limit=PIPELINE_CACHE_BYTES)
+
+        best = searcher.best_estimator_
+        self.encoder = best.named_steps["encoder"]
+        self.model = best.named_steps["model"]
+        self.best_params = {param.removeprefix("model__"): value for param, value in searcher.best_params_.items()}
+        self.cv_score = float(searcher.best_score_)
+        self.cv_results = pd.DataFrame(searcher.cv_results_)[
+            [col for col in ("iter", "n_resources", "params", "mean_test_score", "std_test_score", "rank_test_score")
+             if col in searcher.cv_results_]
+        ]
+        self.X_train = self.encoder.transform(self.raw_train)
+        self.X_test = self.encoder.transform(self.raw_test)
+        self.y_pred = self.model.predict(self.X_test)
+        return self.best_params
 
-    def train(self):
+    @instrumented("entraînement", data=lambda self, *args, **kwargs: self.X_train)
+    def train(self, progress=None):
         if self.model is None:
             raise RuntimeError("Aucun modèle défini.")
-        self.model.fit(self.X_train, self.y_train)
+        if progress is not None and _is_forest(self.model):
+            # Forêt construite par paliers pour suivre (et pouvoir interrompre) l'entraînement.
+            total = self.model.n_estimators
+            self.model.set_params(warm_start=True)
+            for n_estimators in sorted({max(1, total * step // TRAIN_STEPS) for step in range(1, TRAIN_STEPS + 1)}):
+                self.model.set_params(n_estimators=n_estimators)
+                self.model.fit(self.X_train, self.y_train)
+                progress(n_estimators / total)
+            self.model.set_params(warm_start=False)
+        else:
+            self.model.fit(self.X_train, self.y_train)
         self.y_pred = self.model.predict(self.X_test)
 
+    def can_update(self):
+        return _is_forest(self.model) or _is_sgd_pipeline(self.model)
+
+    def _appended(self, df):
+        # Les données prolongent celles de l'entraînement si leurs `n_rows`
+        # premières lignes complètes ont la même empreinte.
+        columns = self.features + [self.target]
+        if self.rows_fingerprint is None or any(col not in df.columns for col in columns):
+            return None, None
+        df = df.dropna(subset=columns)
+        if len(df) < self.n_rows:
+            return None, None
+        hashes = row_hashes(df[columns])
+        if rows_fingerprint(hashes[:self.n_rows]) != self.rows_fingerprint:
+            return None, None
+        return df.iloc[self.n_rows:], hashes
+
+    def appended_rows(self, df):
+        return self._appended(df)[0]
+
+    @instrumented("mise à jour incrémentale", data=lambda self, df, *args, **kwargs: df)
+    def update(self, df, test_size=0.2, random_state=42):
+        # Apprentissage des seules lignes ajoutées depuis l'entraînement : le
+        # coût dépend du volume de nouvelles données, pas du volume total.
+        if not self.can_update():
+            raise ValueError("Ce modèle ne peut pas être mis à jour de façon incrémentale.")
+        new_rows, hashes = self._appended(df)
+        if new_rows is None:
+            raise ValueError("Les données ne prolongent pas celles de l'entraînement.")
+        if new_rows.empty:
+            return 0
+
+        from sklearn.model_selection import train_test_split
+
+        raw_train, y_train = new_rows[self.features], new_rows[self.target]
+        raw_test, y_test = raw_train.iloc[:0], y_train.iloc[:0]
+        n_test = int(len(new_rows) * test_size)
+        if n_test:
+            raw_train, raw_test, y_train, y_test = train_test_split(
+                raw_train, y_train, test_size=n_test, random_state=random_state
+            )
+        X_train = self.encoder.transform(raw_train)
+
+        if _is_forest(self.model):
+            if set(np.unique(y_train)) != set(self.model.classes_):
+                raise ValueError("Les nouvelles lignes ne couvrent pas les mêmes classes que l'entraînement.")
+            # Nouveaux arbres appris sur les nouvelles lignes, en proportion de leur part dans les données.
+            n_trees = len(self.model.estimators_)
+            extra = max(1, round(n_trees * len(y_train) / len(self.y_train)))
+            self.model.set_params(warm_start=True, n_estimators=n_trees + extra)
+            self.model.fit(X_train, y_train)
+            self.model.set_params(warm_start=False)
+        else:
+            scaler, sgd = self.model.named_steps["scaler"], self.model.named_steps["sgd"]
+            scaler.partial_fit(X_train)
+            sgd.partial_fit(scaler.transform(X_train), y_train)
+
+        from scipy import sparse
+
+        self.X_train = sparse.vstack([self.X_train, X_train], format="csr")
+        self.y_train = pd.concat([self.y_train, y_train])
+        if n_test:
+            self.X_test = sparse.vstack([self.X_test, self.encoder.transform(raw_test)], format="csr")
+            self.y_test = pd.concat([self.y_test, y_test])
+        self.y_pred = self.model.predict(self.X_test)
+        self.n_rows = len(hashes)
+        self.rows_fingerprint = rows_fingerprint(hashes)
+        self.incremental_rows += len(new_rows)
+        return len(new_rows)
+
     def evaluate(self):
+        from sklearn.metrics import accuracy_score, mean_squared_error, r2_score
+
         if self.y_pred is None:
             raise RuntimeError("Le modèle n'a pas encore été entraîné.")
         if self.task_type == "classification":
@@ -73,10 +341,51 @@ class Prediction:
     def plot_confusion_matrix(self):
         if self.task_type != "classification":
             return None
+        # Graphiques importés au premier tracé seulement.
+        import seaborn
+        from matplotlib import pyplot as plt
+        from sklearn.metrics import confusion_matrix
+
         cm = confusion_matrix(self.y_test, self.y_pred)
         fig, ax = plt.subplots()
         seaborn.heatmap(cm, annot=True, fmt="d", cmap="Blues", ax=ax)
         ax.set_xlabel("Prédit")
         ax.set_ylabel("Réel")
         ax.set_title("Matrice de confusion")
-        return fig
\ No newline at end of file
+        return fig
+
+def fit_prediction(df, features, target, task_type, algo, params, key, encoding="onehot", tune=False, report=None):
+    # Entraîne le modèle et l'enregistre sous `key`. Si le dernier modèle de
+    # même configuration a appris sur le début de ces données, il est
+    # seulement mis à jour avec les lignes ajoutées.
+    from src.classes.model_registry import get_model_registry
+
+    report = report or (lambda progress, message="": None)
+    registry = get_model_registry()
+    lineage = params_fingerprint("prediction", features, target, task_type, algo, encoding, sorted(params.items()))
+    previous_key = None if tune else registry.latest(lineage)
+    previous = registry.get(previous_key, mmap=False) if previous_key else None
+    if previous is not None and previous.can_update():
+        report(0.1, "Recherche des lignes ajoutées")
+        try:
+            n_rows = previous.update(df)
+        except ValueError:
+            n_rows = None
+        if n_rows is not None:
+            report(0.9, f"Mise à jour incrémentale ({n_rows} nouvelles lignes)")
+            registry.put(key, previous, lineage=lineage)
+            return previous
+
+    report(0.1, "Préparation des données")
+    predictor = Prediction(df, features=features, target=target, task_type=task_type, encoding=encoding)
+    predictor.split()
+    if tune:
+        # `params` est alors la grille à explorer (grille par défaut si vide).
+        report(0.2, "Recherche des hyperparamètres")
+        predictor.tune(algo, param_grid=params or None)
+    else:
+        predictor.set_model(algo, **params)
+        predictor.train(progress=lambda p: report(0.2 + 0.7 * p, "Entraînement en cours"))
+    report(0.9, "Enregistrement du modèle")
+    registry.put(key, predictor, lineage=None if tune else lineage)
+    return predictor
@@ -0,0 +1,200 @@
+import numpy as np
+import pandas as pd
+
+from src.classes.knn_imputer import FastKNNImputer
+from src.classes.sketches import ModeCounter, QuantileSketch, ReservoirSample, RunningStats
+from src.functions.instrumentation import measure
+
+CHUNKSIZE = 100_000
+SAMPLE_SIZE = 50_000
+KNN_SAMPLE_SIZE = 500_000
+
+IMPUTATIONS = [None, "drop_rows", "drop_columns", "mean", "median", "mode", "knn", "iterative"]
+SCALINGS = [None, "minmax", "zscore", "robust"]
+
+class Preprocessor:
+    def __init__(self, columns, imputation=None, scaling=None, n_neighbors=3, max_iter=10, knn_mode="exact",
+                 sample_size=None, chunksize=CHUNKSIZE, random_state=0):
+        if imputation not in IMPUTATIONS:
+            raise ValueError("Méthode d'imputation non reconnue.")
+        if scaling not in SCALINGS:
+            raise ValueError("Méthode de normalisation non reconnue.")
+        self.columns = list(columns)
+        self.imputation = imputation
+        self.scaling = scaling
+        self.n_neighbors = n_neighbors
+        self.max_iter = max_iter
+        self.knn_mode = knn_mode
+        if sample_size is None:
+            # L'imputation KNN sur index supporte un échantillon bien plus grand.
+            sample_size = KNN_SAMPLE_SIZE if imputation == "knn" else SAMPLE_SIZE
+        self.sample_size = sample_size
+        self.chunksize = chunksize
+        self.random_state = random_state
+
+        self.missing = {}
+        self.fill_values = {}
+        self.dropped_columns = []
+        self.imputed_columns = []
+        self.imputer = None
+        self.scaled_columns = []
+        self.center = None
+        self.scale = None
+
+    def _chunks(self, source):
+        # Un DataFrame est découpé en tranches ; un `File` fournit ses propres blocs.
+        if isinstance(source, pd.DataFrame):
+            for start in range(0, len(source), self.chunksize):
+                yield source.iloc[start:start + self.chunksize]
+        else:
+            yield from source.iter_chunks()
+
+    def _values(self, chunk, columns):
+        return chunk[columns].to_numpy(dtype="float64", na_value=np.nan)
+
+    def _new_accumulators(self):
+        stats = RunningStats(len(self.columns))
+        sketches = None
+        if self.imputation == "median" or self.scaling == "robust":
+            sketches = [QuantileSketch(random_state=self.random_state) for _ in self.columns]
+        return stats, sketches
+
+    def _accumulate(self, stats, sketches, values):
+        stats.update(values)
+        if sketches is not None:
+            for i, sketch in enumerate(sketches):
+                sketch.update(values[:, i])
+
+    def fit(self, source):
+        # Premier passage : toutes les statistiques sont accumulées bloc par bloc.
+        stats, sketches = self._new_accumulators()
+        counters = [ModeCounter() for _ in self.columns] if self.imputation == "mode" else None
+        reservoir = None
+        if self.imputation in ("knn", "iterative"):
+            reservoir = ReservoirSample(self.sample_size, random_state=self.random_state)
+
+        for chunk in self._chunks(source):
+            values = self._values(chunk, self.columns)
+            if self.imputation == "drop_rows":
+                values = values[~np.isnan(values).any(axis=1)]
+            self._accumulate(stats, sketches, values)
+            if counters is not None:
+                for counter, col in zip(counters, self.columns):
+                    counter.update(chunk[col])
+            if reservoir is not None:
+                reservoir.update(values)
+
+        self.missing = dict(zip(self.columns, stats.nulls.tolist()))
+
+        if self.imputation == "drop_columns":
+            self.dropped_columns = [col for col in self.columns if self.missing[col] > 0]
+
+        elif self.imputation in ("mean", "median", "mode"):
+            counts = np.zeros(len(self.columns))
+            values = np.zeros(len(self.columns))
+            for i, col in enumerate(self.columns):
+                if self.imputation == "mean":
+                    value = stats.mean[i] if stats.count[i] else None
+                elif self.imputation == "median":
+                    value = sketches[i].quantile(0.5) if stats.count[i] else None
+                else:
+                    value = counters[i].mode()
+                if value is None:
+                    continue
+                self.fill_values[col] = value
+                counts[i] = self.missing[col]
+                values[i] = value
+                if sketches is not None and counts[i]:
+                    sketches[i].add_weighted(value, counts[i])
+            # Les valeurs imputées sont constantes : les statistiques de
+            # normalisation s'en déduisent sans relire les données.
+            stats.add_constant(values, counts)
+
+        elif self.imputation in ("knn", "iterative"):
+            self.imputed_columns = [
+                col for i, col in enumerate(self.columns) if self.missing[col] > 0 and stats.count[i] > 0
+            ]
+            if self.imputed_columns:
+                positions = [self.columns.index(col) for col in self.imputed_columns]
+                if self.imputation == "knn":
+                    self.imputer = FastKNNImputer(
+                        n_neighbors=self.n_neighbors, mode=self.knn_mode, random_state=self.random_state
+                    )
+                else:
+                    from sklearn.experimental import enable_iterative_imputer  # noqa
+                    from sklearn.impute import IterativeImputer
+                    self.imputer = IterativeImputer(random_state=self.random_state, max_iter=self.max_iter)
+                self.imputer.fit(reservoir.rows[:, positions])
+
+                if self.scaling is not None:
+                    # Second passage : les valeurs imputées dépendent du modèle.
+                    stats, sketches = self._new_accumulators()
+                    for chunk in self._chunks(source):
+                        self._accumulate(stats, sketches, self._values(self._impute(chunk), self.columns))
+
+        self._fit_scaling(stats, sketches)
+        return self
+
+    def _fit_scaling(self, stats, sketches):
+        if self.scaling is None:
+            return
+        positions = [i for i, col in enumerate(self.columns) if col not in self.dropped_columns]
+        self.scaled_columns = [self.columns[i] for i in positions]
+        if self.scaling == "minmax":
+            center = stats.min[positions]
+            scale = stats.max[positions] - center
+        elif self.scaling == "zscore":
+            center = stats.mean[positions]
+            scale = stats.std[positions]
+        else:
+            center = np.array([sketches[i].quantile(0.5) for i in positions])
+            scale = np.array([sketches[i].quantile(0.75) - sketches[i].quantile(0.25) for i in positions])
+        # Même convention que scikit-learn pour les colonnes constantes.
+        scale = np.where(np.isfinite(scale) & (scale != 0), scale, 1.0)
+        self.center = np.where(np.isfinite(center), center, 0.0)
+        self.scale = scale
+
+    def _impute(self, chunk):
+        df = chunk.copy(deep=False)
+        if self.imputation == "drop_rows":
+            df = df.dropna(subset=self.columns)
+        elif self.imputation == "drop_columns":
+            df = df.drop(columns=self.dropped_columns)
+        elif self.fill_values:
+            df = df.fillna(self.fill_values)
+        elif self.imputer is not None and len(df):
+            arr = self.imputer.transform(self._values(df, self.imputed_columns))
+            df[self.imputed_columns] = pd.DataFrame(arr, columns=self.imputed_columns, index=df.index)
+        return df
+
+    def transform(self, chunk):
+        df = self._impute(chunk)
+        if self.scaled_columns and len(df):
+            values = self._values(df, self.scaled_columns)
+            df[self.scaled_columns] = (values - self.center) / self.scale
+        return df
+
+    def fit_transform(self, df):
+        steps = [f"imputation {self.imputation}" if self.imputation else None,
+                 f"normalisation {self.scaling}" if self.scaling else None]
+        with measure(" + ".join(step for step in steps if step) or "prétraitement", df):
+            return self.fit(df).transform(df)
+
+    def transform_chunks(self, source):
+        # Second passage : les statistiques apprises sont appliquées bloc par bloc.
+        for chunk in self._chunks(source):
+            yield self.transform(chunk)
+
+    def iter_csv(self, source):
+        # Le résultat en CSV, un morceau de texte par bloc : un fichier plus
+        # grand que la mémoire peut être exporté ou renvoyé au fil de l'eau.
+        header = True
+        for chunk in self.transform_chunks(source):
+            yield chunk.to_csv(header=header, index=False)
+            header = False
+
+    def export_csv(self, source, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            for text in self.iter_csv(source):
+                f.write(text)
+        return path
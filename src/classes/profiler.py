@@ -0,0 +1,171 @@
+import logging
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.classes.sketches import HyperLogLog, QuantileSketch, RunningStats, TopK
+
+CHUNKSIZE = 100_000
+PROFILE_DIR = "./cache/profiles"
+# Modifié quand le contenu du profil change : les anciens profils ne sont pas relus.
+PROFILE_VERSION = 3
+TOP_K = 5
+# Au-delà, les comptes de TopK deviennent approchés et une colonne numérique
+# est considérée comme continue : ses valeurs les plus fréquentes ne sont plus suivies.
+TOP_K_MAX_DISTINCT = 1_000
+
+def _common_dtype(current, new):
+    # Type commun de deux blocs (int8 puis float32 -> float32), object sinon.
+    if current is None or current == new:
+        return new
+    try:
+        return np.result_type(current, new)
+    except TypeError:
+        return np.dtype(object)
+
+def _format_value(value, dtype):
+    # `value_counts().to_dict()` rend des float Python : 0.1 lu en float32
+    # s'afficherait 0.10000000149011612. La valeur est réécrite dans le type
+    # de la colonne, qui donne la représentation la plus courte.
+    dtype = getattr(dtype, "numpy_dtype", dtype)
+    if isinstance(value, float) and getattr(dtype, "kind", None) == "f":
+        return str(dtype.type(value))
+    return value
+
+class Profiler:
+    # Profil de toutes les colonnes en un seul passage, bloc par bloc :
+    # effectifs, valeurs manquantes, min/max, moyenne/écart-type et quantiles
+    # approchés (colonnes numériques), nombre approché de valeurs distinctes
+    # (HyperLogLog) et valeurs les plus fréquentes (toutes les colonnes, tant
+    # qu'une colonne numérique ne dépasse pas TOP_K_MAX_DISTINCT valeurs distinctes).
+    def __init__(self, top_k=TOP_K, random_state=0):
+        self.top_k = top_k
+        self.random_state = random_state
+        self.columns = None
+        self.numeric_columns = None
+        self.other_columns = None
+        self.dtypes = {}
+        self.n_rows = 0
+
+    def _start(self, chunk):
+        self.columns = list(chunk.columns)
+        self.numeric_columns = [
+            col for col in self.columns
+            if pd.api.types.is_numeric_dtype(chunk[col]) and not pd.api.types.is_bool_dtype(chunk[col])
+        ]
+        self.other_columns = [col for col in self.columns if col not in self.numeric_columns]
+        self.stats = RunningStats(len(self.numeric_columns))
+        self.sketches = [QuantileSketch(random_state=self.random_state) for _ in self.numeric_columns]
+        self.nulls = np.zeros(len(self.other_columns), dtype=np.int64)
+        self.distinct = {col: HyperLogLog() for col in self.columns}
+        self.top = {col: TopK(self.top_k, capacity=TOP_K_MAX_DISTINCT) for col in self.columns}
+
+    def update(self, chunk):
+        if self.columns is None:
+            self._start(chunk)
+        self.n_rows += len(chunk)
+        for col, dtype in chunk.dtypes.items():
+            self.dtypes[col] = _common_dtype(self.dtypes.get(col), dtype)
+        if self.numeric_columns:
+            values = chunk[self.numeric_columns].to_numpy(dtype="float64", na_value=np.nan)
+            self.stats.update(values)
+            for i, col in enumerate(self.numeric_columns):
+                column = values[:, i]
+                self.sketches[i].update(column)
+                self.distinct[col].update_hashes(pd.util.hash_array(column[~np.isnan(column)]))
+                if col in self.top:
+                    if self.distinct[col].count() > TOP_K_MAX_DISTINCT:
+                        del self.top[col]
+                    else:
+                        self.top[col].update(chunk[col])
+        if self.other_columns:
+            self.nulls += chunk[self.other_columns].isna().sum().to_numpy()
+            for col in self.other_columns:
+                self.distinct[col].update(chunk[col])
+                self.top[col].update(chunk[col])
+        return self
+
+    def fit(self, source, chunksize=CHUNKSIZE):
+        # Un DataFrame est découpé en tranches ; un `File` fournit ses propres blocs.
+        if isinstance(source, pd.DataFrame):
+            chunks = (source.iloc[start:start + chunksize] for start in range(0, len(source), chunksize))
+        else:
+            chunks = source.iter_chunks()
+        for chunk in chunks:
+            self.update(chunk)
+        if isinstance(source, pd.DataFrame):
+            if self.columns is None:
+                self.update(source)
+            self.dtypes = dict(source.dtypes)
+        return self
+
+    def report(self, dtypes=None):
+        # `dtypes` : types du DataFrame final, qui priment sur ceux déduits des blocs.
+        dtypes = dict(self.dtypes if dtypes is None else dtypes)
+        rows = {}
+        for i, col in enumerate(self.numeric_columns):
+            count = self.stats.count[i]
+            rows[col] = {
+                "valeurs": int(count),
+                "manquantes": int(self.stats.nulls[i]),
+                "moyenne": self.stats.mean[i] if count else np.nan,
+                # Écart-type corrigé, comme `describe`.
+                "écart-type": np.sqrt(self.stats.m2[i] / (count - 1)) if count > 1 else np.nan,
+                "min": self.stats.min[i] if count else np.nan,
+                "25%": self.sketches[i].quantile(0.25),
+                "50%": self.sketches[i].quantile(0.5),
+                "75%": self.sketches[i].quantile(0.75),
+                "max": self.stats.max[i] if count else np.nan
+            }
+        for i, col in enumerate(self.other_columns):
+            rows[col] = {
+                "valeurs": int(self.n_rows - self.nulls[i]),
+                "manquantes": int(self.nulls[i])
+            }
+        for col in self.columns:
+            rows[col]["type"] = str(dtypes[col])
+            if col in self.top:
+                rows[col]["plus fréquentes"] = ", ".join(f"{_format_value(value, dtypes[col])} ({count})" for value, count in self.top[col].top())
+            rows[col]["distinctes (approx.)"] = self.distinct[col].count()
+        columns = [
+            "type", "valeurs", "manquantes", "distinctes (approx.)", "moyenne", "écart-type",
+            "min", "25%", "50%", "75%", "max", "plus fréquentes"
+        ]
+        report = pd.DataFrame.from_dict(rows, orient="index")
+        return report.reindex(index=self.columns, columns=columns)
+
+def _profile_path(key):
+    return Path(PROFILE_DIR) / f"{key}-v{PROFILE_VERSION}.pkl"
+
+def cached_profile(key):
+    path = _profile_path(key)
+    if not path.exists():
+        return None
+    try:
+        return pd.read_pickle(path)
+    except Exception as e:
+        logging.error(f"Profil illisible {path} : {e}")
+        return None
+
+def store_profile(key, profile):
+    path = _profile_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        profile.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+def profile_frame(df, key=None):
+    # Profil mis en cache par empreinte du jeu de données.
+    profile = cached_profile(key) if key is not None else None
+    if profile is None:
+        profile = Profiler().fit(df).report()
+        if key is not None:
+            store_profile(key, profile)
+    return profile
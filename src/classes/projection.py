@@ -0,0 +1,99 @@
+import numpy as np
+
+from src.classes.visualizer import downsample
+from src.functions.instrumentation import instrumented
+from src.functions.memory import available_memory
+
+CHUNKSIZE = 10_000
+RANDOMIZED_MIN_FEATURES = 500
+NONLINEAR_SAMPLE_SIZE = 5_000
+METHODS = ["pca", "tsne", "umap"]
+
+class Projection:
+    # Projection 2D des données d'un clustering, calculée une fois puis
+    # enregistrée avec le modèle. L'ACP porte sur toutes les lignes (solveur
+    # exact, SVD randomisée ou ACP incrémentale par blocs selon la largeur des
+    # données et la mémoire disponible) ; t-SNE et UMAP, non linéaires et bien
+    # plus coûteux, portent sur un échantillon stratifié par cluster.
+    def __init__(self, method="pca", mode="auto", sample_size=NONLINEAR_SAMPLE_SIZE, random_state=0):
+        if method not in METHODS:
+            raise ValueError(f"Projection non reconnue : {method}")
+        self.method = method
+        self.mode = mode
+        self.sample_size = sample_size
+        self.random_state = random_state
+        self.coords = None
+        self.rows = None
+        self.components = None
+        self.mean = None
+        self.explained_variance_ratio = None
+
+    def select_mode(self, X):
+        if self.method != "pca":
+            return "sample"
+        # Les solveurs en mémoire travaillent sur une copie centrée des données.
+        available = available_memory()
+        if available is not None and X.shape[0] * X.shape[1] * 8 * 3 > available // 2:
+            return "incremental"
+        # Pour des données étroites, le solveur exact de scikit-learn (matrice
+        # de covariance) est plus rapide que la SVD randomisée.
+        if X.shape[1] > RANDOMIZED_MIN_FEATURES:
+            return "randomized"
+        return "full"
+
+    @instrumented("projection 2D", data=lambda self, X, labels=None: X)
+    def fit(self, X, labels=None):
+        from sklearn.decomposition import PCA, IncrementalPCA
+
+        self.mode = self.select_mode(X) if self.mode == "auto" else self.mode
+        n_components = min(2, X.shape[1])
+        if self.mode == "full":
+            model = PCA(n_components=n_components).fit(X)
+        elif self.mode == "randomized":
+            model = PCA(n_components=n_components, svd_solver="randomized", random_state=self.random_state).fit(X)
+        elif self.mode == "incremental":
+            model = IncrementalPCA(n_components=n_components)
+            for start in range(0, len(X), CHUNKSIZE):
+                chunk = X[start:start + CHUNKSIZE]
+                # Chaque appel exige au moins `n_components` lignes.
+                if len(chunk) >= n_components:
+                    model.partial_fit(chunk)
+        elif self.mode == "sample":
+            self.rows = downsample(len(X), labels, size=self.sample_size, random_state=self.random_state)
+            self.coords = self._embed(X[self.rows]).astype(np.float32)
+            return self
+        else:
+            raise ValueError("Mode de projection non reconnu.")
+
+        self.components = model.components_
+        self.mean = model.mean_
+        self.explained_variance_ratio = model.explained_variance_ratio_
+        coords = np.zeros((len(X), 2), dtype=np.float32)
+        for start in range(0, len(X), CHUNKSIZE):
+            coords[start:start + CHUNKSIZE, :n_components] = (X[start:start + CHUNKSIZE] - self.mean) @ self.components.T
+        self.coords = coords
+        return self
+
+    def _embed(self, X):
+        if self.method == "tsne":
+            from sklearn.manifold import TSNE
+
+            perplexity = min(30.0, max(1.0, (len(X) - 1) / 3))
+            return TSNE(n_components=2, init="pca", perplexity=perplexity, random_state=self.random_state).fit_transform(X)
+        try:
+            import umap
+        except ImportError:
+            raise ValueError("La projection UMAP nécessite le paquet umap-learn.")
+        return umap.UMAP(n_components=2, random_state=self.random_state).fit_transform(X)
+
+    def sample(self, values):
+        # Valeurs (étiquettes...) alignées sur les points projetés.
+        values = np.asarray(values)
+        return values if self.rows is None else values[self.rows]
+
+    def axis_labels(self):
+        if self.method != "pca":
+            name = "t-SNE" if self.method == "tsne" else "UMAP"
+            return f"{name} 1", f"{name} 2"
+        ratios = list(self.explained_variance_ratio) + [0.0]
+        return f"PC1 ({ratios[0]:.0%})", f"PC2 ({ratios[1]:.0%})"
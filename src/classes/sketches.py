@@ -0,0 +1,220 @@
+import numpy as np
+from collections import Counter
+
+class RunningStats:
+    # Moyenne et variance par colonne, fusionnées bloc par bloc (formules de Chan).
+    def __init__(self, n_columns):
+        self.count = np.zeros(n_columns)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+        self.min = np.full(n_columns, np.inf)
+        self.max = np.full(n_columns, -np.inf)
+        self.nulls = np.zeros(n_columns, dtype=np.int64)
+
+    def update(self, values):
+        values = np.asarray(values, dtype="float64")
+        mask = ~np.isnan(values)
+        n_b = mask.sum(axis=0)
+        sum_b = np.where(mask, values, 0.0).sum(axis=0)
+        mean_b = sum_b / np.maximum(n_b, 1)
+        m2_b = np.where(mask, (values - mean_b) ** 2, 0.0).sum(axis=0)
+        self._merge(n_b, mean_b, m2_b)
+        self.min = np.minimum(self.min, np.where(mask, values, np.inf).min(axis=0, initial=np.inf))
+        self.max = np.maximum(self.max, np.where(mask, values, -np.inf).max(axis=0, initial=-np.inf))
+        self.nulls += (~mask).sum(axis=0)
+        return self
+
+    def add_constant(self, value, count):
+        # Ajoute `count` occurrences de `value` par colonne (valeurs imputées).
+        value = np.asarray(value, dtype="float64")
+        count = np.asarray(count, dtype="float64")
+        self._merge(count, value, np.zeros_like(value))
+        present = count > 0
+        self.min = np.where(present, np.minimum(self.min, value), self.min)
+        self.max = np.where(present, np.maximum(self.max, value), self.max)
+        return self
+
+    def _merge(self, n_b, mean_b, m2_b):
+        n = self.count + n_b
+        safe_n = np.maximum(n, 1)
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * n_b / safe_n
+        self.m2 = self.m2 + m2_b + delta ** 2 * self.count * n_b / safe_n
+        self.count = n
+
+    @property
+    def variance(self):
+        return np.where(self.count > 0, self.m2 / np.maximum(self.count, 1), np.nan)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+class QuantileSketch:
+    # Résumé de quantiles par compactions successives (famille KLL) : chaque
+    # niveau garde au plus k valeurs, un élément du niveau i pèse 2**i.
+    def __init__(self, k=2048, random_state=0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(random_state)
+
+    def update(self, values):
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        if values.size:
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self._compress()
+        return self
+
+    def add_weighted(self, value, weight):
+        weight = int(weight)
+        if weight <= self.k:
+            return self.update(np.full(weight, float(value)))
+        level = 0
+        while weight:
+            if weight & 1:
+                while len(self.levels) <= level:
+                    self.levels.append(np.empty(0))
+                self.levels[level] = np.append(self.levels[level], float(value))
+            weight >>= 1
+            level += 1
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.k:
+                items = np.sort(items)
+                leftover = items[-1:] if len(items) % 2 else items[:0]
+                if len(items) % 2:
+                    items = items[:-1]
+                promoted = items[self.rng.integers(2)::2]
+                self.levels[level] = leftover
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    @property
+    def count(self):
+        return sum(len(items) << level for level, items in enumerate(self.levels))
+
+    def quantile(self, q):
+        if self.count == 0:
+            return np.nan
+        if all(len(items) == 0 for items in self.levels[1:]):
+            # Aucune compaction : le résultat est exact.
+            return float(np.quantile(self.levels[0], q))
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 1 << level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        position = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        return float(values[order][min(position, len(values) - 1)])
+
+class ModeCounter:
+    def __init__(self):
+        self.counts = Counter()
+
+    def update(self, series):
+        self.counts.update(series.value_counts(dropna=True).to_dict())
+        return self
+
+    def mode(self):
+        if not self.counts:
+            return None
+        best = max(self.counts.values())
+        # En cas d'égalité, pandas renvoie la plus petite valeur.
+        return min(value for value, count in self.counts.items() if count == best)
+
+class ReservoirSample:
+    def __init__(self, size, random_state=0):
+        self.size = size
+        self.seen = 0
+        self.rows = None
+        self.rng = np.random.default_rng(random_state)
+
+    def update(self, rows):
+        rows = np.asarray(rows)
+        if self.rows is None:
+            self.rows = np.empty((0,) + rows.shape[1:], dtype=rows.dtype)
+        free = max(0, self.size - len(self.rows))
+        if free:
+            self.rows = np.concatenate([self.rows, rows[:free]])
+            self.seen += min(free, len(rows))
+            rows = rows[free:]
+        if len(rows):
+            positions = self.seen + np.arange(len(rows))
+            slots = self.rng.integers(0, positions + 1)
+            accepted = slots < self.size
+            # L'affectation garde la dernière ligne pour un même emplacement,
+            # comme l'algorithme R séquentiel.
+            self.rows[slots[accepted]] = rows[accepted]
+            self.seen += len(rows)
+        return self
+
+def _bit_length(values):
+    # Longueur binaire exacte d'entiers uint64 : chaque moitié de 32 bits est
+    # représentée sans perte en float64, dont `frexp` donne l'exposant.
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+class HyperLogLog:
+    # Nombre approximatif de valeurs distinctes, en mémoire constante
+    # (2**p registres ; erreur relative de l'ordre de 1.04 / sqrt(2**p)).
+    def __init__(self, p=14):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def update_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        width = 64 - self.p
+        index = (hashes >> np.uint64(width)).astype(np.int64)
+        rest = hashes & np.uint64((1 << width) - 1)
+        rank = (width - _bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def update(self, values):
+        # Valeurs numériques hachées en float64 : un même nombre lu en int8
+        # dans un bloc et en float32 dans un autre n'est compté qu'une fois.
+        import pandas as pd
+
+        values = pd.Series(values).dropna()
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            hashes = pd.util.hash_array(values.to_numpy(dtype="float64"))
+        else:
+            hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        return self.update_hashes(hashes)
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            # Petites cardinalités : comptage linéaire des registres vides.
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+class TopK:
+    # Valeurs les plus fréquentes en mémoire bornée : seules les `capacity`
+    # valeurs les plus vues sont suivies. Les comptes sont exacts pour les
+    # valeurs fréquentes, approchés pour les valeurs rares.
+    def __init__(self, k=5, capacity=1_000):
+        self.k = k
+        self.capacity = capacity
+        self.counts = Counter()
+
+    def update(self, series):
+        counts = series.value_counts(dropna=True)
+        self.counts.update(counts[counts > 0].head(self.capacity).to_dict())
+        if len(self.counts) > self.capacity:
+            self.counts = Counter(dict(self.counts.most_common(self.capacity)))
+        return self
+
+    def top(self):
+        return self.counts.most_common(self.k)
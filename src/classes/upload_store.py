@@ -0,0 +1,162 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from src.functions.fingerprint import BLOCK_SIZE, remember_file_fingerprint
+
+UPLOAD_DIR = "./uploads"
+QUOTA_BYTES = int(os.environ.get("UPLOAD_QUOTA_BYTES", 2 * 1024 * 1024 * 1024))
+# Un fichier utilisé récemment n'est jamais supprimé, même au-delà du quota.
+MIN_IDLE_SECONDS = 600
+SWEEP_INTERVAL = 60
+# Fichiers temporaires laissés par une écriture interrompue.
+STALE_TMP_SECONDS = 24 * 3600
+
+class _HashingWriter:
+    # Écrit dans le fichier temporaire en calculant l'empreinte au passage.
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+        self.path = None
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.f.write(data)
+
+class UploadStore:
+    # Fichiers envoyés rangés par empreinte du contenu (sha256) : un fichier
+    # reçu plusieurs fois n'est stocké qu'une fois. La date de dernier accès
+    # (atime, mise à jour explicitement) sert à supprimer les fichiers les
+    # moins récemment utilisés dès que le quota est dépassé.
+    def __init__(self, directory=UPLOAD_DIR, quota_bytes=QUOTA_BYTES, min_idle=MIN_IDLE_SECONDS):
+        self.directory = Path(directory)
+        self.quota_bytes = quota_bytes
+        self.min_idle = min_idle
+        self.wakeup = threading.Event()
+        self.sweeper = None
+        self.lock = threading.Lock()
+
+    def _path(self, digest):
+        return self.directory / f"{digest}.csv"
+
+    @contextmanager
+    def writer(self):
+        # Renvoie un objet à `write` ; à la sortie du bloc, `writer.path` est
+        # le chemin définitif du contenu écrit.
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".tmp", dir=self.directory)
+        writer = _HashingWriter(tmp)
+        try:
+            with tmp:
+                yield writer
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+        writer.path = self._commit(tmp.name, writer.digest.hexdigest())
+
+    def _commit(self, tmp_path, digest):
+        path = self._path(digest)
+        # Contenu déjà stocké : son accès est rafraîchi avant de jeter la copie,
+        # pour qu'un balayage concurrent ne le supprime pas entre-temps.
+        if self.touch(path):
+            os.unlink(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+            if self.size() > self.quota_bytes:
+                self.wakeup.set()
+        # Contenu déjà haché : la clé du cache des jeux de données n'a pas à relire le fichier.
+        remember_file_fingerprint(path, digest)
+        return str(path)
+
+    def put(self, fileobj):
+        with self.writer() as writer:
+            shutil.copyfileobj(fileobj, writer, BLOCK_SIZE)
+        return writer.path
+
+    def touch(self, path):
+        # Seule la date d'accès change : la date de modification, qui entre dans
+        # l'empreinte mémorisée du fichier, est conservée.
+        try:
+            stat = os.stat(path)
+            os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _entries(self):
+        entries = []
+        for path in self.directory.glob("*.csv"):
+            try:
+                entries.append((path, path.stat()))
+            except FileNotFoundError:
+                pass
+        return entries
+
+    def size(self):
+        return sum(stat.st_size for _, stat in self._entries())
+
+    def sweep(self):
+        # Supprime les fichiers les moins récemment utilisés jusqu'à revenir
+        # sous le quota. Renvoie le nombre d'octets libérés.
+        now = time.time()
+        with self.lock:
+            for tmp_path in self.directory.glob("*.tmp"):
+                try:
+                    if now - tmp_path.stat().st_mtime > STALE_TMP_SECONDS:
+                        tmp_path.unlink()
+                except FileNotFoundError:
+                    pass
+            entries = sorted(self._entries(), key=lambda entry: entry[1].st_atime)
+            used = sum(stat.st_size for _, stat in entries)
+            freed = 0
+            for path, stat in entries:
+                if used - freed <= self.quota_bytes:
+                    break
+                if now - stat.st_atime < self.min_idle:
+                    continue
+                path.unlink(missing_ok=True)
+                freed += stat.st_size
+            if used - freed > self.quota_bytes:
+                logging.warning(
+                    f"Quota des fichiers envoyés dépassé ({used - freed} > {self.quota_bytes} octets) : "
+                    "les fichiers restants sont en cours d'utilisation."
+                )
+        return freed
+
+    def start_sweeper(self, interval=SWEEP_INTERVAL):
+        # Balayage périodique en arrière-plan, avancé dès qu'un envoi dépasse le quota.
+        if self.sweeper is not None:
+            return
+        def run():
+            while True:
+                self.wakeup.wait(interval)
+                self.wakeup.clear()
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logging.error(f"Erreur lors du nettoyage de {self.directory} : {e}")
+        self.sweeper = threading.Thread(target=run, name="upload-sweeper", daemon=True)
+        self.sweeper.start()
+
+_upload_store = None
+_upload_store_lock = threading.Lock()
+
+def get_upload_store():
+    global _upload_store
+    with _upload_store_lock:
+        if _upload_store is None:
+            _upload_store = UploadStore()
+            _upload_store.start_sweeper()
+        return _upload_store
+
+def touch_session_upload(session_state):
+    # Appelé par chaque page : le fichier de la session en cours reste récent
+    # tant que l'utilisateur navigue, même sur les pages qui ne le relisent pas.
+    path = session_state.get("csv_path")
+    return path is not None and get_upload_store().touch(path)
@@ -0,0 +1,187 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from src.classes.dataset_cache import MemoryLRU
+from src.functions.fingerprint import frame_fingerprint, params_fingerprint
+
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
+SCATTER_MAX_POINTS = 20_000
+MIN_POINTS_PER_GROUP = 200
+MAX_FLIERS = 1_000
+DENDROGRAM_LEAVES = 30
+
+# Images PNG déjà rendues, partagées par toutes les sessions du serveur.
+_figures = MemoryLRU(FIGURE_CACHE_BYTES, sizeof=len)
+
+def figure_key(*parts):
+    return params_fingerprint("figure", *parts)
+
+def cached_figure(key):
+    return _figures.get(key)
+
+def _new_figure():
+    # matplotlib n'est chargé qu'au premier rendu : une image en cache s'en passe.
+    from matplotlib.figure import Figure
+
+    fig = Figure()
+    return fig, fig.subplots()
+
+def _to_png(fig, key):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    png = buffer.getvalue()
+    _figures.put(key, png)
+    return png
+
+def downsample(n_rows, labels=None, size=SCATTER_MAX_POINTS, random_state=0):
+    # Indices (triés) d'au plus `size` lignes environ. Avec des étiquettes,
+    # l'échantillon est stratifié : chaque groupe garde sa proportion, et au
+    # moins MIN_POINTS_PER_GROUP points pour que les petits groupes restent visibles.
+    if n_rows <= size:
+        return np.arange(n_rows)
+    rng = np.random.default_rng(random_state)
+    if labels is None:
+        return np.sort(rng.choice(n_rows, size, replace=False))
+    codes, _ = pd.factorize(np.asarray(labels), use_na_sentinel=False)
+    counts = np.bincount(codes)
+    quota = np.maximum(np.minimum(counts, MIN_POINTS_PER_GROUP), counts * size // n_rows)
+    # Permutation aléatoire regroupée par étiquette : on garde les `quota` premiers de chaque groupe.
+    order = rng.permutation(n_rows)
+    order = order[np.argsort(codes[order], kind="stable")]
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    keep = order[np.arange(n_rows) - starts < np.repeat(quota, counts)]
+    return np.sort(keep)
+
+def render_scatter(key, x, y, labels=None, title="", xlabel="", ylabel=""):
+    # Au-delà de SCATTER_MAX_POINTS, un nuage sans étiquettes devient une carte
+    # de densité (hexbin) ; avec étiquettes, il est sous-échantillonné par groupe.
+    x, y = np.asarray(x), np.asarray(y)
+    fig, ax = _new_figure()
+    if labels is None and len(x) > SCATTER_MAX_POINTS:
+        image = ax.hexbin(x, y, gridsize=60, mincnt=1, cmap="viridis")
+        fig.colorbar(image, ax=ax, label="Effectif")
+    else:
+        rows = downsample(len(x), labels)
+        if labels is None:
+            ax.scatter(x[rows], y[rows], s=8, alpha=0.6)
+        else:
+            labels = np.asarray(labels)[rows]
+            for i, label in enumerate(pd.unique(labels)):
+                mask = labels == label
+                ax.scatter(x[rows][mask], y[rows][mask], s=8, alpha=0.6, color=f"C{i % 10}", label=str(label))
+            ax.legend(title="Cluster", markerscale=2, fontsize="small")
+        if len(rows) < len(x):
+            title = f"{title} ({len(rows):,} points sur {len(x):,})".replace(",", " ")
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    return _to_png(fig, key)
+
+def render_dendrogram(key, tree, n_clusters=None, max_leaves=DENDROGRAM_LEAVES, title=""):
+    # Dendrogramme tronqué aux `max_leaves` dernières fusions : au-delà,
+    # chaque feuille regroupe plusieurs points (effectif entre parenthèses).
+    from scipy.cluster.hierarchy import dendrogram
+
+    fig, ax = _new_figure()
+    heights = np.asarray(tree[:, 2])
+    threshold = None
+    if n_clusters is not None and 1 < n_clusters <= len(heights):
+        # Hauteur de coupe entre la dernière fusion gardée et la première défaite.
+        threshold = (heights[-n_clusters] + heights[-n_clusters + 1]) / 2
+    dendrogram(
+        tree, truncate_mode="lastp", p=max_leaves, ax=ax, color_threshold=threshold,
+        above_threshold_color="grey", leaf_rotation=90, leaf_font_size=8
+    )
+    if threshold is not None:
+        ax.axhline(threshold, color="red", linestyle="--", lw=1)
+    ax.set_title(title)
+    ax.set_ylabel("Distance de fusion")
+    return _to_png(fig, key)
+
+class Visualizer:
+    # Histogrammes et boîtes à moustaches d'un jeu de données : les statistiques
+    # de toutes les colonnes demandées sont calculées en un seul passage
+    # vectorisé, et chaque image rendue est mise en cache sous
+    # (empreinte du jeu, colonne, nombre de classes).
+    def __init__(self, df, key=None):
+        self.df = df
+        self.key = key or frame_fingerprint(df)
+
+    def _values(self, columns):
+        return self.df[columns].to_numpy(dtype="float64", na_value=np.nan)
+
+    def histograms(self, columns, bins=30):
+        # `bins` est un entier ou un dictionnaire {colonne: nombre de classes}.
+        columns = list(columns)
+        values = self._values(columns)
+        valid = ~np.isnan(values)
+        n_bins = np.array([bins[col] if isinstance(bins, dict) else bins for col in columns], dtype=np.int64)
+        low = np.where(valid, values, np.inf).min(axis=0, initial=np.inf)
+        high = np.where(valid, values, -np.inf).max(axis=0, initial=-np.inf)
+        low = np.where(np.isfinite(low), low, 0.0)
+        high = np.where(np.isfinite(high), high, 1.0)
+        width = np.where(high > low, (high - low) / n_bins, 1.0 / n_bins)
+        # Chaque colonne occupe sa propre plage d'indices : un seul `bincount` pour tout le bloc.
+        offsets = np.cumsum(n_bins) - n_bins
+        with np.errstate(invalid="ignore"):
+            index = np.clip(np.floor((values - low) / width), 0, n_bins - 1)
+        counts = np.bincount((index + offsets)[valid].astype(np.int64), minlength=int(n_bins.sum()))
+        return {
+            col: (counts[offsets[i]:offsets[i] + n_bins[i]], low[i] + width[i] * np.arange(n_bins[i] + 1))
+            for i, col in enumerate(columns)
+        }
+
+    def box_stats(self, columns, random_state=0):
+        # Statistiques au format de `Axes.bxp` ; au plus MAX_FLIERS valeurs
+        # aberrantes sont tracées par colonne.
+        columns = [col for col in columns if self.df[col].notna().any()]
+        if not columns:
+            return {}
+        values = self._values(columns)
+        q1, median, q3 = np.nanquantile(values, [0.25, 0.5, 0.75], axis=0)
+        iqr = q3 - q1
+        with np.errstate(invalid="ignore"):
+            whislo = np.where(values >= q1 - 1.5 * iqr, values, np.inf).min(axis=0)
+            whishi = np.where(values <= q3 + 1.5 * iqr, values, -np.inf).max(axis=0)
+            outside = (values < whislo) | (values > whishi)
+        rng = np.random.default_rng(random_state)
+        stats = {}
+        for i, col in enumerate(columns):
+            fliers = values[outside[:, i], i]
+            if len(fliers) > MAX_FLIERS:
+                fliers = rng.choice(fliers, MAX_FLIERS, replace=False)
+            stats[col] = {
+                "label": col, "q1": q1[i], "med": median[i], "q3": q3[i],
+                "whislo": whislo[i], "whishi": whishi[i], "fliers": fliers
+            }
+        return stats
+
+    def histogram_pngs(self, columns, bins=30):
+        keys = {col: figure_key(self.key, "histogram", col, bins[col] if isinstance(bins, dict) else bins)
+                for col in columns}
+        images = {col: _figures.get(key) for col, key in keys.items()}
+        missing = [col for col, png in images.items() if png is None]
+        if missing:
+            for col, (counts, edges) in self.histograms(missing, bins).items():
+                fig, ax = _new_figure()
+                ax.stairs(counts, edges, fill=True)
+                ax.set_title(f"Histogramme de {col}")
+                ax.set_xlabel(col)
+                ax.set_ylabel("Effectif")
+                images[col] = _to_png(fig, keys[col])
+        return images
+
+    def boxplot_pngs(self, columns):
+        keys = {col: figure_key(self.key, "boxplot", col) for col in columns}
+        images = {col: _figures.get(key) for col, key in keys.items()}
+        missing = [col for col, png in images.items() if png is None]
+        if missing:
+            for col, stats in self.box_stats(missing).items():
+                fig, ax = _new_figure()
+                ax.bxp([stats], showfliers=True)
+                ax.set_title(f"Boîte à moustaches de {col}")
+                ax.set_ylabel(col)
+                images[col] = _to_png(fig, keys[col])
+        return {col: png for col, png in images.items() if png is not None}
@@ -2,7 +2,18 @@ class APIException(Exception):
     code = 500
     message = 'internal-error'
     description = 'Internal server error'
-    pass
+
+    def __init__(self, code=None, message=None, description=None):
+        if code is not None:
+            self.code = code
+        if message is not None:
+            self.message = message
+        if description is not None:
+            self.description = description
+        super().__init__(self.description)
+
+    def to_dict(self):
+        return {'error': self.message, 'description': self.description}
 
 class BadRequestJSONException(APIException):
     code = 400
@@ -25,13 +36,23 @@ class EmptyDataProvidedException(APIException):
         super().__init__(code=400, message='empty-request', description=description)
 
 class InvalidBase64DataException(APIException):
-    code=400,
-    message='invalid-base64',
-    description='file_data is not a valid base64-encoded string.'
+    code = 400
+    message = 'invalid-base64'
+    description = 'file_data is not a valid base64-encoded string.'
     pass
 
 class InvalidCSVException(APIException):
-    code=400,
-    message='invalid-csv',
-    description='Decoded file_data is not a valid CSV file.'
-    pass
\ No newline at end of file
+    code = 400
+    message = 'invalid-csv'
+    description = 'Decoded file_data is not a valid CSV file.'
+    pass
+
+class InvalidParametersException(APIException):
+    code = 400
+    message = 'invalid-parameters'
+    description = 'Invalid parameters provided.'
+    pass
+
+class NotFoundException(APIException):
+    def __init__(self, resource='Resource'):
+        super().__init__(code=404, message='not-found', description=f'{resource} not found.')
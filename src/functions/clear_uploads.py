@@ -1,7 +1,7 @@
 import logging
 import os
 
-def clear_uploads_folder(folder_path='./src/uploads'):
+def clear_uploads_folder(folder_path='./uploads'):
     if not os.path.exists(folder_path):
         return
     for filename in os.listdir(folder_path):
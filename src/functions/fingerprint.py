@@ -0,0 +1,52 @@
+import hashlib
+import os
+
+BLOCK_SIZE = 1024 * 1024
+
+_file_hashes = {}
+
+def file_fingerprint(path):
+    # Le hash du contenu est mémorisé par (chemin, taille, date de modification)
+    # pour ne relire le fichier qu'après une modification réelle.
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                digest.update(block)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+def remember_file_fingerprint(path, digest):
+    # Empreinte calculée ailleurs (pendant l'écriture du fichier, par exemple).
+    stat = os.stat(path)
+    _file_hashes[(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)] = digest
+
+def frame_fingerprint(df):
+    import pandas as pd
+
+    digest = hashlib.sha256()
+    digest.update(repr(list(zip(map(str, df.columns), map(str, df.dtypes)))).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def params_fingerprint(*parts):
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+def row_hashes(df):
+    # Empreinte de chaque ligne, indépendante de l'index et de la réduction
+    # des types numériques (int8, float32...) faite à la lecture.
+    import pandas as pd
+
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            columns[col] = series.astype("float64")
+        else:
+            columns[col] = series.astype("object")
+    return pd.util.hash_pandas_object(pd.DataFrame(columns, index=df.index), index=False).to_numpy()
+
+def rows_fingerprint(hashes):
+    return hashlib.sha256(hashes.tobytes()).hexdigest()
@@ -0,0 +1,153 @@
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Journal des mesures, une ligne JSON par étape ; vide pour le désactiver.
+LOG_PATH = os.environ.get("PERFORMANCE_LOG", "./logs/performance.jsonl")
+
+COLUMN_NAMES = {
+    "stage": "étape",
+    "wall_time": "durée (s)",
+    "cpu_time": "CPU (s)",
+    "rows": "lignes",
+    "columns": "colonnes",
+    "rows_per_s": "lignes/s",
+    "rss_delta_mb": "Δ mémoire (Mo)",
+    "peak_rss_delta_mb": "Δ pic mémoire (Mo)"
+}
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def shape_of(data):
+    # Dimensions d'un DataFrame ou d'un tableau, pour le débit en lignes/s.
+    shape = getattr(data, "shape", None)
+    if not shape:
+        return {}
+    return {"rows": int(shape[0]), "columns": int(shape[1]) if len(shape) > 1 else 1}
+
+def _write(record):
+    if not LOG_PATH:
+        return
+    path = Path(LOG_PATH)
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Une seule écriture par ligne en mode ajout : les processus de la file
+        # de tâches et le serveur partagent le fichier sans se mélanger.
+        with _log_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+    except OSError as e:
+        logging.error(f"Journal de performances inaccessible {path} : {e}")
+
+def _delta(after, before):
+    return after - before if after is not None and before is not None else None
+
+@contextmanager
+def measure(stage, data=None, **extra):
+    # Temps réel et CPU, variation de la mémoire (et de son pic), dimensions
+    # et débit d'une étape. Les dimensions peuvent aussi être renseignées
+    # dans le bloc : `record.update(shape_of(df))`.
+    # `peak_rss_delta_mb` est la hausse du pic du processus entier
+    # (ru_maxrss) : dans le serveur ou l'API, qui vivent longtemps, il vaut 0
+    # pour toute étape qui reste sous un pic déjà atteint. Ce n'est pas le
+    # pic propre à l'étape.
+    record = {"stage": stage, **shape_of(data), **extra}
+    rss_before, peak_before = rss_mb(), peak_rss_mb()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        wall_time = time.perf_counter() - start
+        record.update({
+            "wall_time": wall_time,
+            "cpu_time": time.process_time() - cpu_start,
+            "rss_delta_mb": _delta(rss_mb(), rss_before),
+            "peak_rss_delta_mb": _delta(peak_rss_mb(), peak_before),
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "pid": os.getpid()
+        })
+        if record.get("rows") is not None:
+            record["rows_per_s"] = record["rows"] / wall_time if wall_time else None
+        records = getattr(_local, "records", None)
+        if records is not None:
+            records.append(record)
+        _write(record)
+
+def instrumented(stage, data=None):
+    # Décorateur : `data` reçoit les arguments de l'appel et renvoie les
+    # données traitées, dont les dimensions sont enregistrées.
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with measure(stage, data(*args, **kwargs) if data is not None else None):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def start_collecting():
+    # Pour une page : les mesures faites par le fil courant sont ajoutées à la
+    # liste renvoyée, jusqu'à l'exécution suivante de la page.
+    _local.records = []
+    return _local.records
+
+@contextmanager
+def collect():
+    previous = getattr(_local, "records", None)
+    records = _local.records = []
+    try:
+        yield records
+    finally:
+        _local.records = previous
+        if previous is not None:
+            previous.extend(records)
+
+def measures_frame(records):
+    import pandas as pd
+
+    frame = pd.DataFrame(list(records), columns=list(COLUMN_NAMES))
+    return frame.rename(columns=COLUMN_NAMES).round(3)
+
+def show_measures(records, job_records=None):
+    # Panneau « Performances » commun aux pages. `job_records` : mesures
+    # renvoyées par un processus de la file de tâches.
+    import streamlit as st
+
+    with st.expander("⏱️ Performances de la page"):
+        if job_records:
+            st.markdown("**Processus de la file de tâches**")
+            st.dataframe(measures_frame(job_records))
+        if records:
+            if job_records:
+                st.markdown("**Cet affichage**")
+            st.dataframe(measures_frame(records))
+        if not records and not job_records:
+            st.caption("Aucun calcul lors de cet affichage : les résultats proviennent du cache.")
+        else:
+            st.caption(
+                "Δ pic mémoire : hausse du pic de mémoire de tout le processus. Elle reste à 0 "
+                "pour une étape qui ne dépasse pas un pic déjà atteint ; ce n'est pas le pic de l'étape."
+            )
@@ -0,0 +1,83 @@
+import base64
+import binascii
+import json
+import re
+
+from src.exceptions import BadRequestJSONException, EmptyDataProvidedException, InvalidBase64DataException
+
+BLOCK_SIZE = 1024 * 1024
+ESCAPES = {b"n": b"", b"r": b"", b"t": b"", b"/": b"/"}
+
+class Base64StreamDecoder:
+    # Décodage base64 par blocs : seuls quelques octets non alignés sur 4
+    # caractères sont gardés entre deux appels.
+    def __init__(self, out):
+        self.out = out
+        self.pending = b""
+        self.size = 0
+
+    def write(self, data):
+        data = self.pending + re.sub(rb"\s+", b"", data)
+        aligned = len(data) - len(data) % 4
+        self.pending = data[aligned:]
+        if aligned:
+            try:
+                decoded = base64.b64decode(data[:aligned], validate=True)
+            except binascii.Error:
+                raise InvalidBase64DataException()
+            self.out.write(decoded)
+            self.size += len(decoded)
+
+    def close(self):
+        if self.pending.rstrip(b"="):
+            raise InvalidBase64DataException()
+        return self.size
+
+def extract_base64_field(stream, out, field="file_data", block_size=BLOCK_SIZE):
+    # Lit un corps JSON par blocs, décode le champ base64 `field` directement
+    # dans `out` et renvoie les autres champs, qui restent de petite taille.
+    key = re.compile(rb'"' + re.escape(field.encode("utf-8")) + rb'"\s*:\s*"')
+    decoder = Base64StreamDecoder(out)
+    rest = b""
+    state = "search"
+    carry = b""
+
+    for block in iter(lambda: stream.read(block_size), b""):
+        if state == "search":
+            rest += block
+            match = key.search(rest)
+            if match is None:
+                continue
+            block = rest[match.end():]
+            rest = rest[:match.start()] + b'"' + field.encode("utf-8") + b'": ""'
+            state = "value"
+        if state == "value":
+            block = carry + block
+            carry = b""
+            end = block.find(b'"')
+            value = block if end == -1 else block[:end]
+            if value.endswith(b"\\") and not value.endswith(b"\\\\"):
+                # Séquence d'échappement coupée entre deux blocs.
+                carry, value = value[-1:], value[:-1]
+            decoder.write(re.sub(rb"\\(.)", lambda m: ESCAPES.get(m.group(1), b"\0"), value))
+            if end != -1:
+                rest += block[end + 1:]
+                state = "done"
+        elif state == "done":
+            rest += block
+
+    if state == "search":
+        raise EmptyDataProvidedException(field)
+    if state == "value":
+        raise BadRequestJSONException()
+    size = decoder.close()
+    try:
+        fields = json.loads(rest.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise BadRequestJSONException()
+    if not isinstance(fields, dict):
+        raise BadRequestJSONException()
+    if size == 0:
+        raise EmptyDataProvidedException(field)
+    fields.pop(field, None)
+    return fields